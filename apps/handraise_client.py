@@ -0,0 +1,673 @@
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import struct
+import time
+from urllib.parse import quote, urlencode, urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Client library for the Handraise API, used by the student and teacher apps
+# and by the load generators in bench/.
+#
+# HandraiseClient blocks and can be shared between threads (one pooled
+# requests.Session). AsyncHandraiseClient is the same API for asyncio, on its
+# own keep-alive connection pool over asyncio streams, so one process can
+# drive thousands of simulated students. Both apply the same timeouts and
+# retry policy, and both can follow a classroom's teacher stream: the
+# subscription reconnects on its own and resumes from the last event id.
+# The async client can also open a classroom WebSocket (ClassroomSocket),
+# which carries requests and events on one connection.
+#
+# Calls return the response (status_code, headers, json()) and leave status
+# codes to the caller; HandraiseError means no answer came back at all, even
+# after retrying. Connections are only reused when the server keeps them
+# open: Flask's development server closes every one after its response.
+
+DEFAULT_URL = "http://127.0.0.1:5000"
+TIMEOUT = (3.05, 10) # connect, read
+STREAM_READ_TIMEOUT = 45 # the hub sends a keepalive every 15s: three missed means the stream is dead
+POOL_SIZE = 10 # keep-alive connections per client
+
+
+class HandraiseError(Exception):
+    pass
+
+
+class RetryPolicy:
+    # Only requests that are safe to repeat are retried: reads, acknowledges
+    # (a repeat just gets 404) and anything carrying an Idempotency-Key, like
+    # the student outbox's signals. They are retried after a transport error
+    # or a gateway status, with exponential backoff and jitter.
+    RETRY_STATUSES = (502, 503, 504)
+    SAFE_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+    def __init__(self, attempts=3, backoff=0.25, max_backoff=5):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delays(self, method, headers):
+        # Seconds to wait before each retry of this request (none if it isn't safe to repeat)
+        if method not in self.SAFE_METHODS and "Idempotency-Key" not in headers:
+            return
+        delay = self.backoff
+        for _ in range(self.attempts - 1):
+            yield delay * random.uniform(0.5, 1.0)
+            delay = min(delay * 2, self.max_backoff)
+
+
+# Waits between stream reconnects: quick at first, then backing off while the server is away
+class StreamBackoff:
+    def __init__(self, first=0.5, limit=30):
+        self.first = first
+        self.limit = limit
+        self.delay = first
+
+    def reset(self):
+        self.delay = self.first
+
+    def next(self):
+        delay = self.delay * random.uniform(0.5, 1.0) # jitter so a school doesn't reconnect in lockstep
+        self.delay = min(self.delay * 2, self.limit)
+        return delay
+
+
+# Incremental text/event-stream parser: feed() bytes as they arrive and get
+# back (id, data) for every event completed. Keepalive comments are skipped.
+# id is None for frames sent without one, which must not move the resume point.
+class SSEParser:
+    def __init__(self):
+        self.buffer = b""
+        self.event_id = None
+        self.data = []
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b"\n")
+        events = []
+        for line in lines:
+            line = line.rstrip(b"\r")
+            if not line:
+                if self.data:
+                    events.append((self.event_id, b"\n".join(self.data).decode()))
+                self.event_id, self.data = None, []
+                continue
+            field, _, value = line.partition(b":")
+            if value.startswith(b" "):
+                value = value[1:]
+            if field == b"data":
+                self.data.append(value)
+            elif field == b"id":
+                self.event_id = value.decode()
+        return events
+
+
+def decode_payload(data):
+    # A list of stream events (see server/events.py), or the status text
+    # ("connected", "resync") for the lines that aren't JSON
+    try:
+        return json.loads(data)
+    except ValueError:
+        return data
+
+
+def class_path(class_id, *rest):
+    # Class ids come from users: quote them so any id is one path segment
+    return "/".join(("/classrooms", quote(class_id, safe=""), *rest))
+
+
+def _if_none_match(etag):
+    return {"If-None-Match": etag} if etag else {}
+
+
+def _query(**params):
+    # "?a=1&b=2" of the params that are set, or ""
+    params = {name: value for name, value in params.items() if value is not None}
+    return "?" + urlencode(params) if params else ""
+
+
+# Every endpoint, built once for both clients. request() returns the response
+# in HandraiseClient and a coroutine of it in AsyncHandraiseClient, so the
+# async versions are simply awaited.
+class _Endpoints:
+    # Large classes: pass limit (and the last page's next_cursor as cursor) to
+    # read one page at a time, or since=<version> for only what changed since
+    # an earlier response; 410 means that version is too old to catch up from.
+
+    def classroom(self, class_id, etag=None, since=None):
+        return self.request("GET", class_path(class_id) + _query(since=since), headers=_if_none_match(etag))
+
+    def students(self, class_id, etag=None, limit=None, cursor=None, since=None):
+        return self.request(
+            "GET", class_path(class_id, "students") + _query(limit=limit, cursor=cursor, since=since),
+            headers=_if_none_match(etag),
+        )
+
+    def signals(self, class_id, etag=None, limit=None, cursor=None, since=None):
+        return self.request(
+            "GET", class_path(class_id, "signals") + _query(limit=limit, cursor=cursor, since=since),
+            headers=_if_none_match(etag),
+        )
+
+    def signal_types(self, etag=None):
+        return self.request("GET", "/signal-types", headers=_if_none_match(etag))
+
+    def create_classroom(self, class_id, name, coalesce_ms=None):
+        body = {"name": name}
+        if coalesce_ms is not None:
+            body["coalesce_ms"] = coalesce_ms
+        return self.request("POST", class_path(class_id, "create"), json=body)
+
+    def join(self, class_id, name):
+        return self.request("POST", class_path(class_id, "join"), json={"name": name})
+
+    def leave(self, class_id, name):
+        return self.request("DELETE", class_path(class_id, "leave"), json={"name": name})
+
+    def roster(self, class_id, join=(), leave=()):
+        return self.request("POST", class_path(class_id, "roster"), json={"join": list(join), "leave": list(leave)})
+
+    def send_signal(self, class_id, name, signal_type, key=None):
+        # Pass the same key when sending a signal again, so it is only ever shown once
+        headers = {"Idempotency-Key": key} if key else {}
+        return self.request(
+            "POST", class_path(class_id, "signal"), json={"name": name, "signal_type": signal_type}, headers=headers
+        )
+
+    def acknowledge(self, class_id, signal_id):
+        return self.request("DELETE", class_path(class_id, "signal", "remove"), json={"id": signal_id})
+
+    def signal_counts(self, **query):
+        # class_id, type, since, until, resolution: see /analytics in server/api_backend.py
+        return self.request("GET", "/analytics/signals?" + urlencode(query))
+
+    def ack_times(self, **query):
+        return self.request("GET", "/analytics/ack-times?" + urlencode(query))
+
+
+# --- blocking ---
+
+class HandraiseClient(_Endpoints):
+    def __init__(self, base_url=DEFAULT_URL, timeout=TIMEOUT, retry=None, pool_size=POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size) # the API and the stream hub
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, json=None, headers=None):
+        headers = headers or {}
+        delays = self.retry.delays(method, headers)
+        while True:
+            error = None
+            try:
+                response = self.session.request(
+                    method, self.base_url + path, json=json, headers=headers, timeout=self.timeout
+                )
+                if response.status_code not in RetryPolicy.RETRY_STATUSES:
+                    return response
+            except requests.RequestException as e:
+                error = e
+
+            delay = next(delays, None)
+            if delay is None:
+                if error is not None:
+                    raise HandraiseError(f"{method} {path}: {error}") from error
+                return response
+            time.sleep(delay)
+
+    def subscribe(self, class_id, last_event_id=None):
+        return Subscription(self, class_id, last_event_id)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# A classroom's teacher stream. Iterating yields decoded payloads (see
+# decode_payload) and never ends on its own: on any failure it waits and
+# reconnects with Last-Event-ID, so the server replays what was missed or
+# opens with a fresh snapshot. close() ends it from another thread.
+class Subscription:
+    CHUNK_SIZE = 4096
+
+    def __init__(self, client, class_id, last_event_id=None):
+        self.client = client
+        self.class_id = class_id
+        self.last_event_id = last_event_id
+        self.closed = False
+        self.on_error = None # optional callback(exception) for each dropped connection
+        self._response = None
+
+    def __iter__(self):
+        backoff = StreamBackoff()
+        url = self.client.base_url + class_path(self.class_id, "stream")
+        while not self.closed:
+            try:
+                headers = {"Accept": "text/event-stream"}
+                if self.last_event_id is not None:
+                    headers["Last-Event-ID"] = self.last_event_id
+                self._response = self.client.session.get(
+                    url, headers=headers, stream=True, timeout=(self.client.timeout[0], STREAM_READ_TIMEOUT)
+                )
+                if self._response.status_code != 200:
+                    raise HandraiseError(f"Stream for {self.class_id}: HTTP {self._response.status_code}")
+
+                parser = SSEParser()
+                while not self.closed:
+                    # read1: hand over whatever arrived instead of waiting for a full chunk
+                    chunk = self._response.raw.read1(self.CHUNK_SIZE)
+                    if not chunk:
+                        raise HandraiseError(f"Stream for {self.class_id} closed by the server")
+                    for event_id, data in parser.feed(chunk):
+                        backoff.reset()
+                        if event_id is not None:
+                            self.last_event_id = event_id
+                        yield decode_payload(data)
+            except Exception as e:
+                if self.closed:
+                    return
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                if self._response is not None:
+                    self._response.close()
+            if not self.closed:
+                time.sleep(backoff.next())
+
+    def close(self):
+        self.closed = True
+        response = self._response
+        if response is not None:
+            response.close() # wakes the reading thread up
+
+
+# --- asyncio ---
+
+# What the async client returns: the parts of requests.Response the apps use
+class Response:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+async def _read_head(reader, timeout):
+    # (HTTP version, status, headers) of a response
+    status_line = await asyncio.wait_for(reader.readline(), timeout)
+    if not status_line:
+        raise ConnectionError("Server closed the connection")
+    version, status, _ = (status_line.decode("latin-1").rstrip("\r\n") + " ").split(" ", 2)
+    headers = CaseInsensitiveDict()
+    while True:
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        if line in (b"\r\n", b"\n"):
+            return version, int(status), headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip()] = value.strip()
+
+
+async def _read_body(reader, method, status, headers, timeout):
+    # (body, whether the connection can carry another request)
+    keep_alive = headers.get("Connection", "").lower() != "close"
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        return b"", keep_alive
+    if "Content-Length" in headers:
+        return await asyncio.wait_for(reader.readexactly(int(headers["Content-Length"])), timeout), keep_alive
+    if headers.get("Transfer-Encoding", "").lower() == "chunked":
+        body = b""
+        while True:
+            size = int((await asyncio.wait_for(reader.readline(), timeout)).split(b";")[0], 16)
+            chunk = await asyncio.wait_for(reader.readexactly(size + 2), timeout) # data + CRLF
+            if not size:
+                return body, keep_alive
+            body += chunk[:-2]
+    return await asyncio.wait_for(reader.read(), timeout), False # delimited by the server closing
+
+
+def _request_bytes(method, target, host, body, headers):
+    lines = [f"{method} {target} HTTP/1.1", f"Host: {host}", "Accept-Encoding: identity"]
+    if body is not None:
+        lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b"")
+
+
+class AsyncHandraiseClient(_Endpoints):
+    # Create inside the event loop that will use it; not thread-safe
+    TRANSPORT_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError)
+
+    def __init__(self, base_url=DEFAULT_URL, timeout=TIMEOUT, retry=None, pool_size=POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        parts = urlsplit(self.base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self._slots = asyncio.Semaphore(pool_size) # requests in flight at once
+        self._idle = [] # (reader, writer) kept alive for the next request
+
+    async def request(self, method, path, json=None, headers=None):
+        headers = headers or {}
+        body = None if json is None else _dumps(json)
+        delays = self.retry.delays(method, headers)
+        while True:
+            error = None
+            try:
+                response = await self._send(method, path, body, headers)
+                if response.status_code not in RetryPolicy.RETRY_STATUSES:
+                    return response
+            except self.TRANSPORT_ERRORS as e:
+                error = e
+
+            delay = next(delays, None)
+            if delay is None:
+                if error is not None:
+                    raise HandraiseError(f"{method} {path}: {error!r}") from error
+                return response
+            await asyncio.sleep(delay)
+
+    async def _send(self, method, path, body, headers):
+        async with self._slots:
+            while True:
+                reused = bool(self._idle)
+                if reused:
+                    reader, writer = self._idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout[0]
+                    )
+                try:
+                    writer.write(_request_bytes(method, path, f"{self.host}:{self.port}", body, headers))
+                    await writer.drain()
+                    _, status, response_headers = await _read_head(reader, self.timeout[1])
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if not reused:
+                        raise
+                    # The server closed it while it sat idle: try again on a new connection
+                except BaseException:
+                    writer.close()
+                    raise
+            try:
+                content, keep_alive = await _read_body(reader, method, status, response_headers, self.timeout[1])
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return Response(status, response_headers, content)
+
+    def subscribe(self, class_id, last_event_id=None):
+        return AsyncSubscription(self, class_id, last_event_id)
+
+    async def connect(self, class_id, events=True, last_event_id=None):
+        # A ClassroomSocket: requests on one connection, plus the classroom's
+        # events unless events=False (a student that only sends)
+        query = {"events": "1" if events else "0"}
+        if last_event_id is not None:
+            query["last_event_id"] = last_event_id
+        path = class_path(class_id, "ws") + "?" + urlencode(query)
+        # The API redirects sockets to the hub, but Flask refuses upgrade
+        # requests: ask where it is with a plain GET, then upgrade there
+        response = await self.request("GET", path)
+        if response.status_code != 307:
+            raise HandraiseError(f"Socket for {class_id}: HTTP {response.status_code}")
+        url = urljoin(self.base_url + path, response.headers["Location"])
+        headers = {
+            "Upgrade": "websocket",
+            "Connection": "Upgrade",
+            "Sec-WebSocket-Key": base64.b64encode(os.urandom(16)).decode(),
+            "Sec-WebSocket-Version": "13",
+        }
+        _, reader, writer, _ = await _open(url, headers, 101, self.timeout)
+        return ClassroomSocket(class_id, reader, writer, self.timeout[1], last_event_id)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def _dumps(body):
+    return json.dumps(body).encode()
+
+
+async def _open(url, headers, expect, timeout, redirects=3):
+    # GET url on a connection of its own, following redirects, until the
+    # server answers `expect`: (final url, reader, writer, response headers)
+    for _ in range(redirects + 1):
+        parts = urlsplit(url)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), timeout[0])
+        try:
+            target = parts.path + (f"?{parts.query}" if parts.query else "")
+            writer.write(_request_bytes("GET", target, parts.netloc, None, headers))
+            await writer.drain()
+            _, status, response_headers = await _read_head(reader, timeout[1])
+        except BaseException:
+            writer.close()
+            raise
+        if status == expect:
+            return url, reader, writer, response_headers
+        writer.close()
+        if status in (301, 302, 307, 308) and "Location" in response_headers:
+            url = urljoin(url, response_headers["Location"])
+            continue
+        raise HandraiseError(f"GET {parts.path}: HTTP {status}")
+    raise HandraiseError(f"GET {url}: too many redirects")
+
+
+# The asyncio version of Subscription: `async for payload in subscription`.
+# Each stream has its own connection, outside the request pool. The API
+# redirects streams to the hub; where it lives is remembered for reconnects.
+class AsyncSubscription:
+    CHUNK_SIZE = 4096
+
+    def __init__(self, client, class_id, last_event_id=None):
+        self.client = client
+        self.class_id = class_id
+        self.last_event_id = last_event_id
+        self.closed = False
+        self.on_error = None # optional callback(exception) for each dropped connection
+        self._stream_url = None # the hub's URL for this stream, once redirected there
+        self._writer = None
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        backoff = StreamBackoff()
+        while not self.closed:
+            try:
+                reader = await self._connect()
+                parser = SSEParser()
+                while not self.closed:
+                    chunk = await asyncio.wait_for(reader.read(self.CHUNK_SIZE), STREAM_READ_TIMEOUT)
+                    if not chunk:
+                        raise HandraiseError(f"Stream for {self.class_id} closed by the server")
+                    for event_id, data in parser.feed(chunk):
+                        backoff.reset()
+                        if event_id is not None:
+                            self.last_event_id = event_id
+                        yield decode_payload(data)
+            except (HandraiseError, *AsyncHandraiseClient.TRANSPORT_ERRORS) as e:
+                self._stream_url = None # go through the API again, in case the hub moved
+                if self.on_error is not None and not self.closed:
+                    self.on_error(e)
+            finally:
+                self._close_connection()
+            if not self.closed:
+                await asyncio.sleep(backoff.next())
+
+    async def _connect(self):
+        # Opens the stream, following the API's redirect to the hub; returns the reader
+        url = self._stream_url or self.client.base_url + class_path(self.class_id, "stream")
+        headers = {"Accept": "text/event-stream", "Connection": "close"}
+        if self.last_event_id is not None:
+            headers["Last-Event-ID"] = self.last_event_id
+        self._stream_url, reader, self._writer, _ = await _open(url, headers, 200, self.client.timeout)
+        return reader
+
+    def _close_connection(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self):
+        self.closed = True
+        self._close_connection()
+
+
+# --- WebSocket ---
+
+WS_TEXT, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def _ws_frame(opcode, payload=b""):
+    # One masked frame, as clients must send them
+    mask = os.urandom(4)
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+    key = int.from_bytes((mask * (length // 4 + 1))[:length], "big")
+    return header + mask + (int.from_bytes(payload, "big") ^ key).to_bytes(length, "big")
+
+
+async def _ws_read(reader):
+    # (opcode, payload) of the next frame from the server (unmasked, never fragmented by the hub)
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    return first & 0x0F, await reader.readexactly(length)
+
+
+# One classroom WebSocket: joins, signals, acknowledges and leaves go out on
+# it and each call waits for its reply, returned as a Response like the REST
+# calls'. Iterating yields the pushed event payloads, and last_event_id
+# follows them. It does not reconnect by itself: open a new one with
+# connect(..., last_event_id=socket.last_event_id) to resume.
+class ClassroomSocket:
+    def __init__(self, class_id, reader, writer, timeout, last_event_id=None):
+        self.class_id = class_id
+        self.timeout = timeout
+        self.last_event_id = last_event_id
+        self.closed = False
+        self._reader = reader
+        self._writer = writer
+        self._refs = itertools.count(1)
+        self._waiting = {} # ref -> future of (status, body)
+        self._events = asyncio.Queue() # pushed payloads, None once the socket is gone
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def request(self, op, **fields):
+        if self.closed:
+            raise HandraiseError(f"Socket for {self.class_id} is closed")
+        ref = next(self._refs)
+        reply = self._waiting[ref] = asyncio.get_running_loop().create_future()
+        try:
+            self._writer.write(_ws_frame(WS_TEXT, _dumps({"op": op, "ref": ref, **fields})))
+            await self._writer.drain()
+            status, body = await asyncio.wait_for(reply, self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise HandraiseError(f"{op} on {self.class_id}: {e!r}") from e
+        finally:
+            self._waiting.pop(ref, None)
+        return Response(status, CaseInsensitiveDict(), _dumps(body))
+
+    def join(self, name):
+        return self.request("join", name=name)
+
+    def leave(self, name):
+        return self.request("leave", name=name)
+
+    def send_signal(self, name, signal_type, key=None):
+        return self.request("signal", name=name, signal_type=signal_type, key=key)
+
+    def acknowledge(self, signal_id):
+        return self.request("ack", id=signal_id)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                opcode, payload = await _ws_read(self._reader)
+                if opcode == WS_PING:
+                    self._writer.write(_ws_frame(WS_PONG, payload))
+                elif opcode == WS_CLOSE:
+                    break
+                elif opcode == WS_TEXT:
+                    message = json.loads(payload)
+                    if isinstance(message, dict): # a reply
+                        reply = self._waiting.get(message["ref"])
+                        if reply is not None and not reply.done():
+                            reply.set_result((message["status"], message["body"]))
+                    else: # [seq, payload]
+                        seq, events = message
+                        if seq is not None:
+                            self.last_event_id = str(seq)
+                        self._events.put_nowait(events)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.closed = True
+            for reply in self._waiting.values():
+                if not reply.done():
+                    reply.set_exception(HandraiseError(f"Socket for {self.class_id} closed"))
+            self._events.put_nowait(None)
+
+    def __aiter__(self):
+        return self._pushed()
+
+    async def _pushed(self):
+        while True:
+            payload = await self._events.get()
+            if payload is None:
+                return
+            yield payload
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self._writer.write(_ws_frame(WS_CLOSE, struct.pack("!H", 1000)))
+                await self._writer.drain()
+            except OSError:
+                pass
+        self._read_task.cancel()
+        self._writer.close()
@@ -1,10 +1,19 @@
 import sys
-import requests
+import os
+import json
+import time
+import uuid
+import random
+import threading
 from PyQt5.QtWidgets import QApplication, QScrollArea, QMainWindow, QFrame, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QTextEdit, QMessageBox, QGraphicsDropShadowEffect
-from PyQt5.QtCore import Qt, pyqtSignal 
+from PyQt5.QtCore import Qt, QObject, pyqtSignal 
 from PyQt5.QtGui import QColor
+from handraise_client import HandraiseClient, HandraiseError
 
 SERVER_URL = "http://127.0.0.1:5000" #localhost
+client = HandraiseClient(SERVER_URL)
+OUTBOX_PATH = os.path.join(os.path.expanduser("~"), ".handraise", "outbox.json")
+SIGNAL_TYPES_PATH = os.path.join(os.path.expanduser("~"), ".handraise", "signal_types.json")
 student_name = None 
 class_id = None 
 
@@ -26,6 +35,7 @@ class StudentApp(QMainWindow):
         self.join_class_screen.classJoined.connect(self.change_screen)
         self.signal_screen = SignalScreen()
         self.signal_screen.signalSelected.connect(send_signal)
+        outbox.status.connect(self.signal_screen.show_status)
 
         self.setCentralWidget(self.join_class_screen)
 
@@ -134,18 +144,19 @@ class JoinClassScreen(QFrame):
 
         # 2. Check if classroom exists
         try:
-            response = requests.get(f"{SERVER_URL}/classrooms/{id_field}")
+            response = client.classroom(id_field)
             if response.status_code != 200:
                 self.error_label.setText("Classroom not found.")
                 self.error_label.setVisible(True)
                 return
-        except Exception:
+
+            # SUCCESS — classroom exists
+            response = client.join(id_field, name_field)
+        except HandraiseError:
             self.error_label.setText("Could not connect to server.")
             self.error_label.setVisible(True)
             return
 
-        # SUCCESS — classroom exists
-        response = requests.post(f"{SERVER_URL}/classrooms/{id_field}/join", json={"name": name_field})
         if response.status_code == 200 or response.status_code == 201:
             print("Joined successfully!")
             global class_id, student_name
@@ -159,6 +170,7 @@ class JoinClassScreen(QFrame):
 
 class SignalScreen(QFrame):
     signalSelected = pyqtSignal(str)   # emits signal_type when user taps a button
+    signalTypesChanged = pyqtSignal(dict) # fresh catalog from the server, delivered on the GUI thread
 
     def __init__(self):
         super().__init__()
@@ -184,6 +196,12 @@ class SignalScreen(QFrame):
         scroll.setWidgetResizable(True)
         main_layout.addWidget(scroll)
 
+        # Delivery status from the outbox
+        self.status_label = QLabel("")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.status_label.setStyleSheet("font-size: 16px; color: #717587; font-family: arial, Helvetica, sans-serif;")
+        main_layout.addWidget(self.status_label)
+
         container = QWidget()
         self.buttons_layout = QVBoxLayout()
         self.buttons_layout.setAlignment(Qt.AlignTop)
@@ -193,17 +211,39 @@ class SignalScreen(QFrame):
         # Load buttons from API
         self.load_signal_types()
 
+    def show_status(self, text):
+        self.status_label.setText(text)
+
     # ---------------------------
     # Fetch signal types from API
     # ---------------------------
 
+    # The catalog is cached on disk with its ETag: buttons come up instantly from
+    # the cache, then a background request revalidates it. The server answers
+    # 304 with no body unless the catalog actually changed.
+
     def load_signal_types(self):
+        self.signalTypesChanged.connect(self.show_signal_types)
+        cached = load_cached_signal_types()
+        self.show_signal_types(cached.get("types", {}))
+        threading.Thread(target=self.revalidate_signal_types, args=(cached.get("etag"),), daemon=True).start()
+
+    def revalidate_signal_types(self, etag):
         try:
-            res = requests.get(f"{SERVER_URL}/signal-types")
-            signal_types = res.json()       # { "pencil": "I need a pencil", ... }
-        except Exception as e:
+            res = client.signal_types(etag)
+        except HandraiseError as e:
             print("Failed to load signal types:", e)
             return
+        if res.status_code != 200:
+            return # 304: the cached buttons are current
+        signal_types = res.json()       # { "pencil": "I need a pencil", ... }
+        save_cached_signal_types(res.headers.get("ETag"), signal_types)
+        self.signalTypesChanged.emit(signal_types)
+
+    def show_signal_types(self, signal_types):
+        # Clear out buttons from an older catalog
+        while self.buttons_layout.count():
+            self.buttons_layout.takeAt(0).widget().deleteLater()
 
         # Create a button for each signal type
         for signal_type, text in signal_types.items():
@@ -225,21 +265,152 @@ class SignalScreen(QFrame):
 
             self.buttons_layout.addWidget(btn)
 
-def send_signal(signal_type):
+def load_cached_signal_types():
     try:
-        url = f"{SERVER_URL}/classrooms/{class_id}/signal"
-        payload = {"name": student_name, "signal_type": signal_type}
+        with open(SIGNAL_TYPES_PATH) as f:
+            return json.load(f) # {"etag": ..., "types": {...}}
+    except (OSError, ValueError):
+        return {}
+
+def save_cached_signal_types(etag, signal_types):
+    os.makedirs(os.path.dirname(SIGNAL_TYPES_PATH), exist_ok=True)
+    with open(SIGNAL_TYPES_PATH + ".tmp", "w") as f:
+        json.dump({"etag": etag, "types": signal_types}, f)
+    os.replace(SIGNAL_TYPES_PATH + ".tmp", SIGNAL_TYPES_PATH)
+
+# Signals waiting to reach the server, kept on disk so a flaky network or an
+# app restart never loses a raised hand. A background thread sends them in
+# order through the shared client, backing off exponentially while offline.
+# Each entry carries an Idempotency-Key, so a retry of a request that did
+# reach the server is recognised there and never shows up twice.
+# Only that thread writes the file, and never while holding the lock, so a
+# button press (enqueue, on the GUI thread) never waits on disk I/O.
+class Outbox(QObject):
+    status = pyqtSignal(str)
+
+    MIN_BACKOFF = 0.5
+    MAX_BACKOFF = 30
+    REJECTED = "Couldn't send: " # status text prefix for signals the server refused
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.cond = threading.Condition()
+        self.pending = self.load()
+        self.dirty = False # pending changed since the last save
+        self.retry_after = 0 # seconds the server asked us to wait (429)
 
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return True, response.get_json()
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def save(self, items):
+        # Write then rename, so a crash mid-write leaves the previous outbox intact
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(items, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + ".tmp", self.path)
+
+    def start(self):
+        threading.Thread(target=self.run, name="outbox", daemon=True).start()
+
+    def enqueue(self, class_id, name, signal_type):
+        with self.cond:
+            self.pending.append({
+                "key": uuid.uuid4().hex,
+                "class_id": class_id,
+                "name": name,
+                "signal_type": signal_type,
+            })
+            self.dirty = True
+            self.cond.notify() # the outbox thread saves it before sending
+        self.status.emit("Sending...")
+
+    def persist(self):
+        # Outbox thread only: save the queue as it is now, outside the lock
+        with self.cond:
+            if not self.dirty:
+                return
+            items = list(self.pending)
+            self.dirty = False
+        try:
+            self.save(items)
+        except OSError as e: # keep sending; the next change tries to save again
+            print("Outbox not saved:", e)
+            with self.cond:
+                self.dirty = True
+
+    def run(self):
+        backoff = self.MIN_BACKOFF
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                item = self.pending[0]
+            self.persist()
+
+            self.retry_after = 0
+            outcome = self.deliver(item)
+            if outcome is not None:
+                with self.cond:
+                    self.pending.remove(item)
+                    self.dirty = True
+                    left = len(self.pending)
+                self.persist()
+                backoff = self.MIN_BACKOFF
+                if not left or outcome.startswith(self.REJECTED): # a refusal is always shown
+                    self.status.emit(outcome)
+                continue
+
+            if self.retry_after:
+                # Server says we're sending too fast: wait as long as it asks
+                self.status.emit(f"Slow down - sending again in {self.retry_after:.0f}s")
+                time.sleep(self.retry_after)
+                continue
+
+            self.status.emit(f"Offline - {len(self.pending)} signal(s) will be sent when reconnected")
+            time.sleep(backoff * random.uniform(0.5, 1.0)) # jitter so a classroom doesn't retry in lockstep
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    def deliver(self, item):
+        # Status text once the server has answered for good, or None to retry later
+        try:
+            response = client.send_signal(item["class_id"], item["name"], item["signal_type"], key=item["key"])
+        except HandraiseError as e:
+            print("Signal not delivered yet:", e)
+            return None
+
+        if response.status_code == 429:
+            self.retry_after = float(response.headers.get("Retry-After", 1))
+            return None
+        if response.status_code >= 500:
+            return None
+        if response.status_code == 409:
+            # Same signal sent moments ago: the teacher already has it
+            return "Already sent!"
+        if response.status_code >= 400:
+            # Bad classroom or signal type: retrying won't help, and the teacher never got it
+            print("Signal rejected:", response.status_code, response.text)
+            reason = response.text.strip() or f"error {response.status_code}"
+            return self.REJECTED + reason[:1].lower() + reason[1:]
+        return "Sent!"
+
+outbox = None # created once the QApplication exists
 
-    except Exception as e:
-        return False, str(e)
+def send_signal(signal_type):
+    outbox.enqueue(class_id, student_name, signal_type)
 
 def main():
     if __name__ == "__main__":
         app = QApplication(sys.argv)
+        global outbox
+        outbox = Outbox(OUTBOX_PATH)
+        outbox.start()
         window = StudentApp()
         window.show()
         sys.exit(app.exec())
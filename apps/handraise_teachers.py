@@ -1,12 +1,14 @@
 import sys
-import requests
-from PyQt5.QtWidgets import QApplication, QScrollArea, QMainWindow, QFrame, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QTextEdit, QMessageBox, QGraphicsDropShadowEffect
-from PyQt5.QtGui import QColor
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from sseclient import SSEClient
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtWidgets import QApplication, QMainWindow, QFrame, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QTextEdit, QMessageBox, QGraphicsDropShadowEffect, QListView, QStyledItemDelegate, QStyle
+from PyQt5.QtGui import QColor, QFont, QPainter
+from PyQt5.QtCore import Qt, QThread, QObject, pyqtSignal, QAbstractListModel, QModelIndex, QRect, QSize, QTimer, QEvent
+from handraise_client import HandraiseClient
 
 SERVER_URL = "http://127.0.0.1:5000"
 class_id = None 
+client = HandraiseClient(SERVER_URL)
 
 shadow = QGraphicsDropShadowEffect()
 shadow.setBlurRadius(20)
@@ -14,31 +16,49 @@ shadow.setXOffset(0)
 shadow.setYOffset(5)
 shadow.setColor(QColor(0, 0, 0, 80))  # semi-transparent black
 
+# Follows the classroom stream on its own thread. The subscription reconnects
+# and resumes from the last event id by itself (see handraise_client.py).
 class SSEWorker(QThread):
-    new_message = pyqtSignal(str)
+    new_message = pyqtSignal(object) # a decoded stream payload
 
     def __init__(self, class_id):
         super().__init__()
-        self.class_id = class_id
-        self._running = True
+        self.subscription = client.subscribe(class_id)
+        self.subscription.on_error = lambda e: print(f"{class_id}: could not load messages - {e}")
         
     def run(self):
-        print(f"SSEWorker started for {self.class_id}")
-        while self._running:
-            try: 
-                messages = SSEClient(f"{SERVER_URL}/classrooms/{self.class_id}/stream")
-                for msg in messages:
-                    self.new_message.emit(msg.data)
-
-            except Exception as e:
-                print(f"{self.class_id}: could not load messages - {e}")
-                self.msleep(3000)  # wait 3 seconds before retrying
+        print(f"SSEWorker started for {self.subscription.class_id}")
+        for payload in self.subscription:
+            self.new_message.emit(payload)
         
     def stop(self):
-        self._running = False
+        self.subscription.close()
         self.quit()
         self.wait()
 
+# Runs client calls off the GUI thread, sharing the client's connection pool.
+# Callbacks are delivered back on the GUI thread through a queued Qt signal.
+class RequestExecutor(QObject):
+    _finished = pyqtSignal(object, object)
+
+    def __init__(self, workers=4):
+        super().__init__()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self._finished.connect(lambda callback, result: callback(result))
+
+    # callback(response) with what request() returned, on_error(exception) if it raised
+    def submit(self, request, callback, on_error):
+        def call():
+            try:
+                response = request()
+            except Exception as e:
+                self._finished.emit(on_error, e)
+                return
+            self._finished.emit(callback, response)
+        self.pool.submit(call)
+
+executor = None # created once the QApplication exists
+
 class TeacherApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -160,16 +180,18 @@ class CreateClassSessionUI(QFrame):
             self.error_label.setVisible(True)
             return
 
-        # 2. Check if classroom exists
-        try:
-            response = requests.post(f"{SERVER_URL}/classrooms/{id_field}/create", json={"name":name_field})
-            if response.status_code != 201 and response.status_code != 409:
-                self.error_label.setText("Classroom couldn't be created")
-                self.error_label.setVisible(True)
-                return
-            
-        except Exception:
-            self.error_label.setText("Could not connect to server.")
+        # 2. Create the classroom in the background; the form stays responsive
+        self.join_button.setEnabled(False)
+        executor.submit(
+            lambda: client.create_classroom(id_field, name_field),
+            lambda response: self.create_finished(response, id_field),
+            self.create_failed,
+        )
+
+    def create_finished(self, response, id_field):
+        self.join_button.setEnabled(True)
+        if response.status_code != 201 and response.status_code != 409:
+            self.error_label.setText("Classroom couldn't be created")
             self.error_label.setVisible(True)
             return
 
@@ -177,6 +199,11 @@ class CreateClassSessionUI(QFrame):
         class_id = id_field
         self.classCreated.emit()
 
+    def create_failed(self, error):
+        self.join_button.setEnabled(True)
+        self.error_label.setText("Could not connect to server.")
+        self.error_label.setVisible(True)
+
 class StreamSessionUI(QFrame):
 
     def __init__(self):
@@ -185,6 +212,14 @@ class StreamSessionUI(QFrame):
         self.worker.new_message.connect(self.add_message_to_list)
         self.worker.start()
 
+        # Incoming stream messages are buffered and applied at most once per frame
+        self.incoming = []
+        self.sync = ClassroomSync()
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(16)
+        self.flush_timer.timeout.connect(self.flush_incoming)
+
         outer_layout = QVBoxLayout() 
         top_layout = QHBoxLayout()
         bottom_layout = QHBoxLayout()
@@ -204,6 +239,18 @@ class StreamSessionUI(QFrame):
         top_layout.addWidget(self.id_label)
         top_layout.setContentsMargins(5, 5, 5, 5)
         top_layout.addStretch(1)
+
+        # Head count, kept current by the stream's join / leave deltas
+        self.students_label = QLabel("Students: 0")
+        self.students_label.setStyleSheet("""
+        background-color: #717587;
+        color: white;
+        border-radius: 15px;
+        padding: 10px 20px;
+        font-size: 24px;
+        font-family: arial, Helvetica, sans-serif;
+        """)
+        top_layout.addWidget(self.students_label)
         
         middle_layout = QVBoxLayout()
 
@@ -219,18 +266,24 @@ class StreamSessionUI(QFrame):
         """)
 
         
-        self.list_widget = QWidget()
-        self.signals_layout = QVBoxLayout()
-        self.signals_layout.setContentsMargins(15, 15, 15, 15)
-        self.signals_layout.setSpacing(10)
-        self.list_widget.setLayout(self.signals_layout)
-
-        scroll = QScrollArea()
-        scroll.setWidget(self.list_widget)
-        scroll.setWidgetResizable(True)
+        # Only the visible rows are painted, however long the backlog gets
+        self.model = SignalListModel()
+        self.delegate = SignalDelegate()
+        self.delegate.acknowledged.connect(self.acknowledge)
+
+        scroll = QListView()
+        scroll.setModel(self.model)
+        scroll.setItemDelegate(self.delegate)
+        scroll.setUniformItemSizes(True)
+        scroll.setMouseTracking(True)
+        scroll.setSpacing(5)
+        scroll.setSelectionMode(QListView.NoSelection)
+        scroll.setFocusPolicy(Qt.NoFocus)
+        scroll.setStyleSheet("QListView { background: transparent; border: none; }")
+        self.list_view = scroll
         scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        scroll.setStyleSheet("""
+        scroll.verticalScrollBar().setStyleSheet("""
                             QScrollBar:vertical{                                         
                                 border: none;
                                 width: 5px;
@@ -274,67 +327,260 @@ class StreamSessionUI(QFrame):
 
         outer_layout.addLayout(bottom_layout)
 
-    def add_message_to_list(self, msg):
-        frame = signalFrame(msg) 
-        self.signals_layout.addWidget(frame)
-        self.signals_layout.setAlignment(Qt.AlignHCenter | Qt.AlignTop)
-
-class signalFrame(QFrame):
-    def __init__(self, msg):
-        super().__init__()
-
-        self.message = msg 
-
-        frame_layout = QHBoxLayout()
-        self.setLayout(frame_layout)
-
-        self.setFrameShape(QFrame.StyledPanel)
-        self.setStyleSheet("background-color: white; padding: 10px; border-radius: 20px;")
+    def add_message_to_list(self, data):
+        if not isinstance(data, list):
+            return # stream status lines like "connected"
+
+        # Every message is a list of events (several when the server coalesced a burst)
+        self.incoming.extend(data)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush_incoming(self):
+        batch, self.incoming = self.incoming, []
+        added = [] # consecutive new signals go to the model in one insert
+        for event in batch:
+            if event[0] == SNAPSHOT:
+                # Connect, reconnect or fell behind: the snapshot replaces everything
+                added = []
+                self.model.reset_signals(self.sync.apply_snapshot(event))
+            elif not self.sync.apply(event):
+                continue
+            elif event[0] == SIGNAL:
+                added.append(self.sync.signal(event[2:]))
+            elif event[0] == ACK:
+                self.model.append_signals(added)
+                added = []
+                self.model.remove_signal(event[2])
+        self.model.append_signals(added)
+        self.students_label.setText(f"Students: {self.sync.student_count()}")
+
+    # Optimistic: the row disappears at once and comes back if the server says no
+    def acknowledge(self, signal_id):
+        record = self.model.remove_signal(signal_id)
+        if record is None:
+            return
 
-        self.label = QLabel(self.message)
-        self.label.setStyleSheet("font-size: 18px; font-family: arial, Helvetica, sans-serif;")
-        
-        self.acknowledge_button = QPushButton("Acknowledge")
-        self.acknowledge_button.setStyleSheet("""
-            QPushButton {
-                background-color: #b3e1be;
-                color: white;
-                border-radius: 15px;
-                padding: 10px 10px;
-                font-size: 24px;
-                font-family: arial, Helvetica, sans-serif;
-            }
-            QPushButton:hover {
-                background-color: #47bd78;
-            }
-        """)
-        self.acknowledge_button.pressed.connect(self.remove_signal)
-        
-        frame_layout.addStretch(1)
-        frame_layout.addWidget(self.label)
-        frame_layout.addWidget(self.acknowledge_button)
-    
-    def remove_signal(self):
-        try:
-            response = requests.delete(f"{SERVER_URL}/classrooms/{class_id}/signal/remove", json={"signal": self.message})
-
-            if response.status_code != 200: 
+        def finished(response):
+            # 404: someone else already acknowledged it, which is what we wanted anyway
+            if response.status_code not in (200, 404):
                 print("Could not delete")
-                return
-
-            print("Deleted signal successfully")
-            self.setParent(None)
-            self.deleteLater()
-            self.objectName = None
-            return 
+                self.rollback(record)
+
+        def failed(error):
+            print(f"Could not acknowledge {signal_id} - {error}")
+            self.rollback(record)
+
+        executor.submit(lambda: client.acknowledge(class_id, signal_id), finished, failed)
+
+    def rollback(self, record):
+        # Unless another teacher acknowledged it in the meantime
+        if record["id"] not in self.sync.acked:
+            self.model.restore_signal(record)
+
+# Stream event codes, see server/events.py:
+#   [SIGNAL, v, id, student, type_code, time_ms]   [ACK, v, id]
+#   [JOIN, v, student]   [LEAVE, v, student]
+#   [SNAPSHOT, v, [[type, text, priority], ...], [student, ...], [[id, student, type_code, time_ms], ...]]
+SIGNAL, ACK, JOIN, LEAVE, SNAPSHOT = range(1, 6)
+URGENT, HIGH, NORMAL = range(3) # signal priorities, most urgent first
+
+# Teacher-side copy of the classroom, kept in step with the stream.
+# The stream opens with a snapshot at some version, then sends deltas tagged
+# with the version each change produced; anything at or below the snapshot's
+# version is already in it. Deltas can arrive out of order (coalescing windows,
+# several server workers), so they are applied order-independently: acked ids
+# are remembered so a late SIGNAL can't bring them back, and a student's
+# presence only changes for a newer version than the one that last set it.
+class ClassroomSync:
+    def __init__(self):
+        self.version = 0
+        self.types = [] # type code -> (type, text, priority), from the snapshot
+        self.acked = set()
+        self.roster = {} # name -> (present, version)
+
+    def apply_snapshot(self, event):
+        # Returns the pending signals to show
+        _, self.version, self.types, students, signals = event
+        self.acked = set() # acks up to this version are reflected in the snapshot
+        self.roster = {name: (True, self.version) for name in students}
+        return [self.signal(fields) for fields in signals]
+
+    def signal(self, fields):
+        # [id, student, type_code, time_ms] -> the record the list model shows
+        signal_id, student, code, time_ms = fields
+        signal_type, text, priority = self.types[code]
+        return {
+            "id": signal_id, "student": student, "type": signal_type, "text": text, "time": time_ms / 1000,
+            "priority": priority,
+        }
+
+    def apply(self, event):
+        # False if the event is stale and must not be shown
+        op, v = event[0], event[1]
+        if v <= self.version:
+            return False
+        if op == SIGNAL:
+            return event[2] not in self.acked
+        if op == ACK:
+            self.acked.add(event[2])
+            return True
+        if op in (JOIN, LEAVE):
+            _, version = self.roster.get(event[2], (False, 0))
+            if v <= version:
+                return False
+            self.roster[event[2]] = (op == JOIN, v)
+            return True
+        return False
+
+    def student_count(self):
+        return sum(1 for present, _ in self.roster.values() if present)
+
+def sort_key(signal):
+    # Most urgent first, then oldest first
+    return (signal["priority"], signal["id"])
+
+class SignalListModel(QAbstractListModel):
+    IdRole = Qt.UserRole
+    PriorityRole = Qt.UserRole + 1
 
-        except Exception:
-            print("fail")
+    def __init__(self):
+        super().__init__()
+        self.signals = [] # records, sorted by sort_key
+        self.keys = [] # sort_key of each row, for bisect
+        self.ids = {} # id -> sort_key of each shown signal, to find its row by bisect
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.signals)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        signal = self.signals[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{signal['student']}: {signal['text']}"
+        if role == self.IdRole:
+            return signal["id"]
+        if role == self.PriorityRole:
+            return signal["priority"]
+        return None
+
+    def append_signals(self, signals):
+        # Replays after a reconnect are skipped. A batch that sorts after every
+        # shown row (the usual case) is one insert notification; anything more
+        # urgent is slotted in above the routine rows.
+        new_ids = {}
+        fresh = []
+        for signal in signals:
+            if signal["id"] not in self.ids and signal["id"] not in new_ids:
+                new_ids[signal["id"]] = sort_key(signal)
+                fresh.append(signal)
+        if not fresh:
+            return
+        fresh.sort(key=sort_key)
+        if self.keys and sort_key(fresh[0]) < self.keys[-1]:
+            for signal in fresh:
+                self.insert_signal(signal)
             return
+        first = len(self.signals)
+        self.beginInsertRows(QModelIndex(), first, first + len(fresh) - 1)
+        self.signals.extend(fresh)
+        self.keys.extend(new_ids[signal["id"]] for signal in fresh)
+        self.ids.update(new_ids)
+        self.endInsertRows()
+
+    def insert_signal(self, record):
+        key = sort_key(record)
+        row = bisect.bisect(self.keys, key)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.signals.insert(row, record)
+        self.keys.insert(row, key)
+        self.ids[record["id"]] = key
+        self.endInsertRows()
+
+    def remove_signal(self, signal_id):
+        # Returns the removed record (for rollback), or None if it wasn't shown
+        key = self.ids.get(signal_id)
+        if key is None:
+            return None
+        row = bisect.bisect_left(self.keys, key) # keys are unique: (priority, id)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        record = self.signals.pop(row)
+        del self.keys[row]
+        del self.ids[signal_id]
+        self.endRemoveRows()
+        return record
+
+    def restore_signal(self, record):
+        # Put a rolled-back record back in its place
+        if record["id"] not in self.ids:
+            self.insert_signal(record)
+
+    def reset_signals(self, signals):
+        self.beginResetModel()
+        self.signals = sorted(signals, key=sort_key)
+        self.keys = [sort_key(signal) for signal in self.signals]
+        self.ids = {signal["id"]: key for signal, key in zip(self.signals, self.keys)}
+        self.endResetModel()
+
+# Paints a signal row as a white card with an "Acknowledge" button on the right
+class SignalDelegate(QStyledItemDelegate):
+    acknowledged = pyqtSignal(int)
+
+    ROW_HEIGHT = 70
+    BUTTON_WIDTH = 190
+
+    def __init__(self):
+        super().__init__()
+        self.text_font = QFont("Arial")
+        self.text_font.setPixelSize(18)
+        self.button_font = QFont("Arial")
+        self.button_font.setPixelSize(24)
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def button_rect(self, rect):
+        return QRect(rect.right() - self.BUTTON_WIDTH - 10, rect.top() + 10, self.BUTTON_WIDTH, rect.height() - 20)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+
+        card = option.rect.adjusted(15, 0, -15, 0)
+        urgent = index.data(SignalListModel.PriorityRole) == URGENT
+        painter.setBrush(QColor("#ffd6d6" if urgent else "white"))
+        painter.drawRoundedRect(card, 20, 20)
+
+        button = self.button_rect(card)
+        hovered = option.state & QStyle.State_MouseOver
+        painter.setBrush(QColor("#47bd78" if hovered else "#b3e1be"))
+        painter.drawRoundedRect(button, 15, 15)
+
+        painter.setPen(QColor("white"))
+        painter.setFont(self.button_font)
+        painter.drawText(button, Qt.AlignCenter, "Acknowledge")
+
+        painter.setPen(QColor("black"))
+        painter.setFont(self.text_font)
+        text_rect = QRect(card.left() + 20, card.top(), button.left() - card.left() - 40, card.height())
+        painter.drawText(text_rect, Qt.AlignRight | Qt.AlignVCenter, index.data(Qt.DisplayRole))
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            if self.button_rect(option.rect.adjusted(15, 0, -15, 0)).contains(event.pos()):
+                self.acknowledged.emit(index.data(SignalListModel.IdRole))
+                return True
+        return False
         
 def main(): 
     if __name__ == "__main__":
         app = QApplication(sys.argv)
+        global executor
+        executor = RequestExecutor()
         window = TeacherApp()
         window.show()
         sys.exit(app.exec())
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Bytes on the wire and serialization CPU of the teacher stream encodings.
+#
+# Builds a classroom-like event mix (signals, acknowledgements, joins and
+# leaves, plus a connect snapshot) and encodes it three ways:
+#   - dict:    the previous self-describing JSON deltas
+#              ({"op": "signal", "class": ..., "signal": {..., "text": ...}, "v": ...})
+#   - json:    compact positional events over SSE (events.py)
+#   - msgpack: the same events as a binary msgpack stream, if msgpack is installed
+# Reports bytes per event and microseconds per event to encode a frame and to
+# decode it again on the client, as one JSON object per encoding.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+import events
+from events import EventSchema, SSEEncoding, MsgpackEncoding
+
+SIGNAL_TYPES = {
+    "pencil": "I need a sharpened pencil",
+    "water": "I need to get water",
+    "tissue": "I need a tissue",
+    "restroom": "I need to use the restroom",
+    "emergency": "There's an emergency.",
+    "question": "I have a question",
+    "sick": "I am not feeling well.",
+    "move": "I want to move seats",
+}
+CLASS_ID = "period-3-biology"
+
+
+def make_deltas(count, students):
+    # State deltas as state.py emits them: mostly signals, then their acks
+    rng = random.Random(1)
+    names = [f"student-{n:02d}" for n in range(students)]
+    deltas, pending, v, next_id = [], [], 1, 1
+    for _ in range(count):
+        v += 1
+        roll = rng.random()
+        if roll < 0.55 or not pending:
+            signal_type = rng.choice(list(SIGNAL_TYPES))
+            record = {
+                "id": next_id, "student": rng.choice(names), "type": signal_type,
+                "text": SIGNAL_TYPES[signal_type], "time": time.time(),
+            }
+            pending.append(next_id)
+            next_id += 1
+            deltas.append({"op": "signal", "class": CLASS_ID, "signal": record, "v": v})
+        elif roll < 0.9:
+            deltas.append({"op": "ack", "class": CLASS_ID, "id": pending.pop(0), "v": v})
+        else:
+            op = rng.choice(("join", "leave"))
+            deltas.append({"op": op, "class": CLASS_ID, "student": rng.choice(names), "v": v})
+    return deltas
+
+
+def dict_frame(seq, payload):
+    # What the stream sent before: one JSON object per delta, default separators
+    return f"id: {seq}\ndata: {json.dumps(payload)}\n\n".encode()
+
+
+def sse_decode(frame):
+    return json.loads(frame[frame.index(b"data: ") + 6:])
+
+
+def measure(name, frames_in, encode, decode, repeat):
+    # frames_in: payloads; returns the report for one encoding
+    encoded = [encode(seq, payload) for seq, payload in enumerate(frames_in, 1)]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for seq, payload in enumerate(frames_in, 1):
+            encode(seq, payload)
+    encode_us = (time.perf_counter() - start) / (repeat * len(frames_in)) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in encoded:
+            decode(frame)
+    decode_us = (time.perf_counter() - start) / (repeat * len(frames_in)) * 1e6
+
+    total = sum(len(frame) for frame in encoded)
+    return {
+        "encoding": name,
+        "bytes_total": total,
+        "bytes_per_event": round(total / len(frames_in), 1),
+        "encode_us_per_event": round(encode_us, 2),
+        "decode_us_per_event": round(decode_us, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare teacher stream encodings")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    schema = EventSchema(SIGNAL_TYPES)
+    deltas = make_deltas(args.events, args.students)
+    snapshot = {
+        "v": 1,
+        "students": [f"student-{n:02d}" for n in range(args.students)],
+        "signals": [delta["signal"] for delta in deltas[:20] if delta["op"] == "signal"],
+    }
+
+    # One delta per frame (no coalescing), the connect snapshot first
+    old = [dict(snapshot, op="snapshot")] + deltas
+    new = [[schema.snapshot(snapshot)]] + [[schema.delta(delta)] for delta in deltas]
+
+    results = [measure("dict", old, dict_frame, sse_decode, args.repeat)]
+    results.append(measure("json", new, SSEEncoding.frame, sse_decode, args.repeat))
+    if events.msgpack is not None:
+        unpack = lambda frame: events.msgpack.unpackb(frame)
+        results.append(measure("msgpack", new, MsgpackEncoding.frame, unpack, args.repeat))
+    else:
+        print("msgpack not installed, skipping it", file=sys.stderr)
+
+    baseline = results[0]["bytes_total"]
+    for result in results:
+        result["bytes_vs_dict"] = round(result["bytes_total"] / baseline, 3)
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
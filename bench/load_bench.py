@@ -0,0 +1,276 @@
+import argparse
+import http.client
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Classroom-scale load test for the signal pipeline.
+#
+# Starts api_backend in a subprocess on loopback, creates N classrooms, joins
+# M students to each, opens K teacher SSE streams per classroom and has every
+# student send signals. Reports, as one JSON object per scenario:
+#   - signal -> teacher delivery latency (p50/p95/p99, per delivered copy),
+#     overall and per signal priority (learned from the stream snapshot)
+#   - requests/second for join, signal and acknowledge
+#   - server RSS before and after the run
+# Run with --sweep for a preset series of growing scenarios.
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server")
+HOST = "127.0.0.1"
+SIGNAL_TYPES = ["pencil", "water", "tissue", "restroom", "question", "sick", "emergency"]
+PRIORITY_NAMES = ["urgent", "high", "normal"] # see server/events.py
+SWEEP = [(10, 30, 1), (50, 30, 2), (200, 30, 2), (500, 30, 3)]
+
+BOOTSTRAP = """
+import api_backend
+from werkzeug.serving import make_server
+api_backend.start_services()
+make_server("{host}", {port}, api_backend.app, threaded=True).serve_forever()
+"""
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+
+class Server:
+    def __init__(self, port, extra_env=None):
+        self.port = port
+        env = dict(os.environ, **(extra_env or {}))
+        self.proc = subprocess.Popen(
+            [sys.executable, "-c", BOOTSTRAP.format(host=HOST, port=port)],
+            cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.time() + 15
+        while time.time() < deadline:
+            try:
+                socket.create_connection((HOST, port), timeout=0.2).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("server did not start")
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+_local = threading.local()
+
+
+def request(port, method, path, body=None):
+    # One keep-alive connection per worker thread
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = http.client.HTTPConnection(HOST, port)
+    payload = json.dumps(body) if body is not None else None
+    try:
+        conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = response.read()
+    except (http.client.HTTPException, OSError):
+        _local.conn = None
+        raise
+    return response, data
+
+
+def timed_phase(pool, port, calls):
+    # Run (method, path, body) calls on the pool; returns (results, requests/second)
+    start = time.perf_counter()
+    results = list(pool.map(lambda call: request(port, *call), calls))
+    return results, len(calls) / (time.perf_counter() - start)
+
+
+class TeacherStreams:
+    # K SSE connections per classroom, all read from one selector thread
+    def __init__(self, stream_port, class_ids, per_class):
+        self.received = [] # (recv_time, signal_id)
+        self.priorities = {} # signal type -> priority, from the snapshot
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+        for class_id in class_ids:
+            for _ in range(per_class):
+                sock = socket.create_connection((HOST, stream_port))
+                sock.sendall(f"GET /classrooms/{class_id}/stream HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode())
+                sock.setblocking(False)
+                self.selector.register(sock, selectors.EVENT_READ)
+                self.buffers[sock] = b""
+        self.running = True
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+
+    def _read_loop(self):
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.1):
+                sock = key.fileobj
+                try:
+                    chunk = sock.recv(65536)
+                except BlockingIOError:
+                    continue
+                now = time.perf_counter()
+                if not chunk:
+                    self.selector.unregister(sock)
+                    continue
+                data = self.buffers[sock] + chunk
+                *frames, self.buffers[sock] = data.split(b"\n\n")
+                for frame in frames:
+                    self._parse(frame, now)
+
+    def _parse(self, frame, now):
+        for line in frame.split(b"\n"):
+            if not line.startswith(b"data: "):
+                continue
+            try:
+                data = json.loads(line[6:])
+            except ValueError:
+                continue
+            if not isinstance(data, list):
+                continue # "connected"
+            for event in data:
+                if event[0] == 1: # [SIGNAL, v, id, ...], see server/events.py
+                    self.received.append((now, event[2]))
+                elif event[0] == 5: # [SNAPSHOT, v, [[type, text, priority], ...], ...]
+                    self.priorities.update((signal_type, priority) for signal_type, _, priority in event[2])
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+
+
+def stream_port(http_port, class_id):
+    # The Flask route redirects to the hub; read where it lives
+    conn = http.client.HTTPConnection(HOST, http_port)
+    conn.request("GET", f"/classrooms/{class_id}/stream")
+    location = conn.getresponse().getheader("Location")
+    conn.close()
+    return urlsplit(location).port
+
+
+def latency_summary(latencies):
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else None,
+    }
+
+
+def run_scenario(port, classrooms, students, teachers, signals_per_student, threads, settle, coalesce_ms):
+    server = Server(port)
+    try:
+        rss_start = rss_kb(server.proc.pid)
+        class_ids = [f"bench{i}" for i in range(classrooms)]
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            timed_phase(pool, port, [("POST", f"/classrooms/{c}/create", {"name": c, "coalesce_ms": coalesce_ms}) for c in class_ids])
+
+            joins = [("POST", f"/classrooms/{c}/join", {"name": f"s{n}"}) for c in class_ids for n in range(students)]
+            _, join_rps = timed_phase(pool, port, joins)
+
+            streams = TeacherStreams(stream_port(port, class_ids[0]), class_ids, teachers)
+            time.sleep(0.5) # let every stream subscribe
+
+            sends = []
+            for round_no in range(signals_per_student):
+                for c in class_ids:
+                    for n in range(students):
+                        signal_type = SIGNAL_TYPES[(n + round_no) % len(SIGNAL_TYPES)]
+                        sends.append((c, {"name": f"s{n}", "signal_type": signal_type}))
+
+            sent_at = {} # signal_id -> (send time, signal type)
+            def send(item):
+                class_id, body = item
+                start = time.perf_counter()
+                response, data = request(port, "POST", f"/classrooms/{class_id}/signal", body)
+                if response.status == 201:
+                    sent_at[json.loads(data)["id"]] = start, body["signal_type"]
+                return class_id, response.status, data
+
+            start = time.perf_counter()
+            sent = list(pool.map(send, sends))
+            signal_rps = len(sends) / (time.perf_counter() - start)
+
+            time.sleep(settle) # let the last events drain to the teachers
+            streams.close()
+
+            acks = [
+                ("DELETE", f"/classrooms/{class_id}/signal/remove", {"id": json.loads(data)["id"]})
+                for class_id, status, data in sent if status == 201
+            ]
+            _, ack_rps = timed_phase(pool, port, acks)
+
+        latencies = []
+        by_priority = {}
+        for recv, signal_id in streams.received:
+            if signal_id not in sent_at:
+                continue
+            start, signal_type = sent_at[signal_id]
+            latency = (recv - start) * 1000
+            latencies.append(latency)
+            priority = PRIORITY_NAMES[streams.priorities.get(signal_type, len(PRIORITY_NAMES) - 1)]
+            by_priority.setdefault(priority, []).append(latency)
+        expected = len(sent_at) * teachers
+        return {
+            "classrooms": classrooms,
+            "students_per_class": students,
+            "teachers_per_class": teachers,
+            "signals_sent": len(sends),
+            "deliveries_expected": expected,
+            "deliveries_received": len(latencies),
+            "coalesce_ms": coalesce_ms,
+            "latency_ms": latency_summary(latencies),
+            "latency_ms_by_priority": {
+                name: dict(latency_summary(by_priority[name]), count=len(by_priority[name]))
+                for name in PRIORITY_NAMES if name in by_priority
+            },
+            "rps": {"join": round(join_rps, 1), "signal": round(signal_rps, 1), "acknowledge": round(ack_rps, 1)},
+            "server_rss_kb": {"start": rss_start, "end": rss_kb(server.proc.pid)},
+        }
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classroom-scale load test for the signal pipeline")
+    parser.add_argument("--classrooms", type=int, default=20)
+    parser.add_argument("--students", type=int, default=30, help="students per classroom")
+    parser.add_argument("--teachers", type=int, default=1, help="teacher streams per classroom")
+    parser.add_argument("--signals", type=int, default=3, help="signals per student")
+    parser.add_argument("--threads", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--port", type=int, default=5080)
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait for delivery")
+    parser.add_argument("--coalesce-ms", type=int, default=0, help="classroom coalescing window")
+    parser.add_argument("--sweep", action="store_true", help="run the preset scaling series")
+    args = parser.parse_args()
+
+    scenarios = SWEEP if args.sweep else [(args.classrooms, args.students, args.teachers)]
+    for classrooms, students, teachers in scenarios:
+        result = run_scenario(
+            args.port, classrooms, students, teachers, args.signals, args.threads, args.settle,
+            args.coalesce_ms,
+        )
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
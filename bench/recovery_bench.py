@@ -0,0 +1,72 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+from event_log import EventLog
+
+# Recovery time of the event log vs. log size.
+# For each size, writes a synthetic school day of create/join/signal/ack events
+# straight to one segment, then times EventLog.recover() on the raw log and
+# again after compacting it into a snapshot. Prints one JSON object per line.
+
+SIZES = [10_000, 100_000, 1_000_000]
+CLASSROOMS = 200
+SIGNAL_TYPES = ["pencil", "water", "tissue", "restroom", "question"]
+
+
+def synthetic_events(count):
+    rng = random.Random(count)
+    next_id = 1
+    pending = {}
+    for c in range(CLASSROOMS):
+        yield {"op": "create", "class": f"c{c}", "name": f"Class {c}"}
+    for i in range(count - CLASSROOMS):
+        class_id = f"c{rng.randrange(CLASSROOMS)}"
+        roll = rng.random()
+        if roll < 0.2:
+            yield {"op": "join", "class": class_id, "student": f"s{i}"}
+        elif roll < 0.6 or not pending.get(class_id):
+            record = {"id": next_id, "student": f"s{i}", "type": rng.choice(SIGNAL_TYPES), "text": "", "time": i}
+            pending.setdefault(class_id, []).append(next_id)
+            next_id += 1
+            yield {"op": "signal", "class": class_id, "signal": record}
+        else:
+            yield {"op": "ack", "class": class_id, "id": pending[class_id].pop(0)}
+
+
+def timed_recover(log):
+    start = time.perf_counter()
+    state = log.recover()
+    return time.perf_counter() - start, state
+
+
+def main():
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            log = EventLog(directory)
+            with open(os.path.join(directory, "log-1.jsonl"), "w") as f:
+                for event in synthetic_events(size):
+                    f.write(json.dumps(event) + "\n")
+            log_bytes = os.path.getsize(os.path.join(directory, "log-1.jsonl"))
+
+            log_only, state = timed_recover(log)
+            log.compact(2)
+            snapshot_bytes = os.path.getsize(os.path.join(directory, "snapshot-2.json"))
+            from_snapshot, _ = timed_recover(log)
+
+            print(json.dumps({
+                "events": size,
+                "log_bytes": log_bytes,
+                "snapshot_bytes": snapshot_bytes,
+                "recover_log_s": round(log_only, 4),
+                "recover_snapshot_s": round(from_snapshot, 4),
+                "pending_signals": sum(len(c["signals"]) for c in state.values()),
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+from state import MemoryState
+
+# Concurrency stress check for MemoryState's per-classroom locking.
+# Many threads create, join, leave, signal and acknowledge across a handful of
+# classrooms at once (with a tiny GIL switch interval to force interleaving),
+# then the final state is checked against what every thread recorded.
+# Exits non-zero if anything was lost or duplicated.
+
+THREADS = 32
+CLASSROOMS = 4
+OPS_PER_THREAD = 2000
+
+
+def worker(state, n, results):
+    class_ids = [f"c{i}" for i in range(CLASSROOMS)]
+    created = [c for c in class_ids if state.create(c, c)]
+    sent, acked, joined = [], [], []
+    for i in range(OPS_PER_THREAD):
+        class_id = class_ids[i % CLASSROOMS]
+        name = f"t{n}-s{i}"
+        if state.join(class_id, name) is not None:
+            joined.append((class_id, name))
+        if i % 3 == 0:
+            state.leave(class_id, name)
+            joined.pop()
+        record, _ = state.add_signal(class_id, name, "pencil", "I need a sharpened pencil")
+        sent.append((class_id, record["id"]))
+        if i % 2 == 0 and state.acknowledge(class_id, record["id"]) is not None:
+            acked.append(record["id"])
+        state.students(class_id) # concurrent readers copy while others mutate
+    results[n] = (created, sent, acked, joined)
+
+
+def main():
+    sys.setswitchinterval(1e-6)
+    state = MemoryState()
+    results = {}
+    threads = [threading.Thread(target=worker, args=(state, n, results)) for n in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    errors = []
+    created = [c for r in results.values() for c in r[0]]
+    if sorted(created) != sorted(f"c{i}" for i in range(CLASSROOMS)):
+        errors.append(f"classrooms created {sorted(created)}")
+
+    ids = [signal_id for r in results.values() for _, signal_id in r[1]]
+    if len(ids) != len(set(ids)):
+        errors.append(f"{len(ids) - len(set(ids))} duplicate signal ids")
+
+    acked = {signal_id for r in results.values() for signal_id in r[2]}
+    expected_pending = {}
+    for r in results.values():
+        for class_id, signal_id in r[1]:
+            if signal_id not in acked:
+                expected_pending.setdefault(class_id, set()).add(signal_id)
+    expected_students = {}
+    for r in results.values():
+        for class_id, name in r[3]:
+            expected_students.setdefault(class_id, set()).add(name)
+
+    for class_id in (f"c{i}" for i in range(CLASSROOMS)):
+        pending = [s["id"] for s in state.signals(class_id)]
+        if len(pending) != len(set(pending)) or set(pending) != expected_pending.get(class_id, set()):
+            errors.append(f"{class_id}: pending signals differ from what was sent minus acknowledged")
+        if pending != sorted(pending):
+            errors.append(f"{class_id}: pending signals out of order")
+        students = state.students(class_id)
+        if len(students) != len(set(students)) or set(students) != expected_students.get(class_id, set()):
+            errors.append(f"{class_id}: roster differs from joins minus leaves")
+
+    ops = THREADS * OPS_PER_THREAD
+    print(f"{ops} iterations on {THREADS} threads in {elapsed:.2f}s")
+    for error in errors:
+        print("FAIL:", error)
+    if errors:
+        sys.exit(1)
+    print("OK: nothing lost or duplicated")
+
+
+if __name__ == "__main__":
+    main()
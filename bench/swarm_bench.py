@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+# Thousands of simulated students from one process, on the asyncio client.
+#
+# Starts api_backend like load_bench.py, opens one teacher stream per
+# classroom and runs every student as a coroutine: join, then send a few
+# signals at random moments over --spread seconds, each with an
+# Idempotency-Key so retries are safe. All requests share one client and its
+# --pool connections. Reports, as one JSON object:
+#   - requests/second and request latency (p50/p95/p99)
+#   - responses by status (429/409 are the per-student limiter at work)
+#   - signal -> teacher delivery latency and how many deliveries arrived
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps"))
+
+from handraise_client import AsyncHandraiseClient, HandraiseError, RetryPolicy
+from load_bench import HOST, SIGNAL_TYPES, Server, percentile, rss_kb
+
+
+class Swarm:
+    def __init__(self, client):
+        self.client = client
+        self.request_ms = []
+        self.statuses = {}
+        self.errors = 0
+        self.sent_at = {} # signal id -> send time
+        self.received = [] # (recv time, signal id)
+
+    async def call(self, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+        except HandraiseError:
+            self.errors += 1
+            return None
+        self.request_ms.append((time.perf_counter() - start) * 1000)
+        self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+        return response
+
+    async def student(self, class_id, name, signals, spread):
+        await self.call(self.client.join(class_id, name))
+        for signal_type in random.sample(SIGNAL_TYPES, signals):
+            await asyncio.sleep(random.uniform(0, spread / signals))
+            start = time.perf_counter()
+            response = await self.call(self.client.send_signal(class_id, name, signal_type, key=uuid.uuid4().hex))
+            if response is not None and response.status_code == 201:
+                self.sent_at[response.json()["id"]] = start
+
+    async def teacher(self, subscription):
+        async for payload in subscription:
+            if not isinstance(payload, list):
+                continue # "connected"
+            now = time.perf_counter()
+            for event in payload:
+                if event[0] == 1: # [SIGNAL, v, id, ...], see server/events.py
+                    self.received.append((now, event[2]))
+
+
+async def run(port, classrooms, students, signals, spread, pool, settle):
+    client = AsyncHandraiseClient(f"http://{HOST}:{port}", pool_size=pool, retry=RetryPolicy(attempts=5))
+    swarm = Swarm(client)
+    class_ids = [f"swarm{i}" for i in range(classrooms)]
+    await asyncio.gather(*(swarm.call(client.create_classroom(c, c)) for c in class_ids))
+
+    subscriptions = [client.subscribe(c) for c in class_ids]
+    teachers = [asyncio.ensure_future(swarm.teacher(s)) for s in subscriptions]
+    await asyncio.sleep(1) # let every stream connect
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        swarm.student(c, f"s{n}", signals, spread) for c in class_ids for n in range(students)
+    ))
+    elapsed = time.perf_counter() - start
+
+    await asyncio.sleep(settle) # let the last events drain to the teachers
+    for subscription in subscriptions:
+        subscription.close()
+    for task in teachers:
+        task.cancel()
+    await asyncio.gather(*teachers, return_exceptions=True)
+    await client.close()
+
+    latencies = [(recv - swarm.sent_at[i]) * 1000 for recv, i in swarm.received if i in swarm.sent_at]
+    requests_made = sum(swarm.statuses.values()) + swarm.errors
+    return {
+        "classrooms": classrooms,
+        "students": classrooms * students,
+        "signals_per_student": signals,
+        "pool": pool,
+        "requests": requests_made,
+        "rps": round(requests_made / elapsed, 1),
+        "errors": swarm.errors,
+        "statuses": {str(status): count for status, count in sorted(swarm.statuses.items())},
+        "request_ms": {p: percentile(swarm.request_ms, int(p[1:])) for p in ("p50", "p95", "p99")},
+        "deliveries_expected": len(swarm.sent_at),
+        "deliveries_received": len(latencies),
+        "delivery_ms": {p: percentile(latencies, int(p[1:])) for p in ("p50", "p95", "p99")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated students on the asyncio client")
+    parser.add_argument("--classrooms", type=int, default=100)
+    parser.add_argument("--students", type=int, default=30, help="students per classroom")
+    parser.add_argument("--signals", type=int, default=2, help="signals per student")
+    parser.add_argument("--spread", type=float, default=30.0, help="seconds each student's signals are spread over")
+    parser.add_argument("--pool", type=int, default=64, help="concurrent client connections")
+    parser.add_argument("--port", type=int, default=5085)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait for delivery")
+    args = parser.parse_args()
+
+    server = Server(args.port)
+    try:
+        rss_start = rss_kb(server.proc.pid)
+        result = asyncio.run(run(
+            args.port, args.classrooms, args.students, args.signals, args.spread, args.pool, args.settle
+        ))
+        result["server_rss_kb"] = {"start": rss_start, "end": rss_kb(server.proc.pid)}
+    finally:
+        server.stop()
+    print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
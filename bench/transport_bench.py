@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+# REST + SSE against the classroom WebSocket, side by side.
+#
+# Starts api_backend like load_bench.py and runs the same classroom through
+# each transport in turn. --concurrency students at a time each join, send
+# one signal and get it acknowledged by the teacher, who watches the
+# classroom's events:
+#   - rest: every operation is its own HTTP request; the teacher follows the
+#           SSE stream and acknowledges with DELETE requests
+#   - ws:   each student has a request-only socket; the teacher's socket
+#           carries both the events and the acknowledges
+# Reports, as one JSON object per transport:
+#   - latency per operation (join, signal, ack: p50/p95/p99)
+#   - signal -> teacher delivery latency
+#   - server CPU time per operation (user + system, from /proc)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps"))
+
+from handraise_client import AsyncHandraiseClient
+from load_bench import HOST, SIGNAL_TYPES, Server, percentile
+
+TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / TICKS # utime + stime
+
+
+def summary(values):
+    return {p: percentile(values, int(p[1:])) for p in ("p50", "p95", "p99")}
+
+
+class Run:
+    def __init__(self):
+        self.latency = {"join": [], "signal": [], "ack": []}
+        self.sent_at = {} # signal id -> send time
+        self.delivered = {} # signal id -> first receive time
+        self.failures = 0
+
+    async def timed(self, op, request):
+        start = time.perf_counter()
+        response = await request
+        self.latency[op].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.failures += 1
+        return response
+
+    def watch(self, payload, now):
+        if isinstance(payload, list):
+            for event in payload:
+                if event[0] == 1: # [SIGNAL, v, id, ...], see server/events.py
+                    self.delivered.setdefault(event[2], now)
+
+    def report(self, transport, students, cpu, elapsed):
+        delivery = [(self.delivered[i] - sent) * 1000 for i, sent in self.sent_at.items() if i in self.delivered]
+        operations = sum(len(values) for values in self.latency.values())
+        return {
+            "transport": transport,
+            "students": students,
+            "failures": self.failures,
+            "ops_per_second": round(operations / elapsed, 1),
+            "latency_ms": {op: summary(values) for op, values in self.latency.items()},
+            "delivery_ms": summary(delivery),
+            "delivered": len(delivery),
+            "server_cpu_ms_per_op": round(cpu * 1000 / operations, 3),
+        }
+
+
+async def student_rest(client, run, class_id, name, signal_type):
+    await run.timed("join", client.join(class_id, name))
+    start = time.perf_counter()
+    response = await run.timed("signal", client.send_signal(class_id, name, signal_type, key=uuid.uuid4().hex))
+    signal_id = response.json()["id"]
+    run.sent_at[signal_id] = start
+    await wait_delivered(run, signal_id)
+    await run.timed("ack", client.acknowledge(class_id, signal_id))
+
+
+async def student_ws(client, teacher, run, class_id, name, signal_type):
+    socket = await client.connect(class_id, events=False)
+    try:
+        await run.timed("join", socket.join(name))
+        start = time.perf_counter()
+        response = await run.timed("signal", socket.send_signal(name, signal_type, key=uuid.uuid4().hex))
+        signal_id = response.json()["id"]
+        run.sent_at[signal_id] = start
+        await wait_delivered(run, signal_id)
+        await run.timed("ack", teacher.acknowledge(signal_id))
+    finally:
+        await socket.close()
+
+
+async def wait_delivered(run, signal_id):
+    # The teacher acknowledges what it has seen
+    deadline = time.perf_counter() + 5
+    while signal_id not in run.delivered and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+
+
+async def bench(port, transport, students, concurrency, pid):
+    client = AsyncHandraiseClient(f"http://{HOST}:{port}", pool_size=concurrency + 4)
+    run = Run()
+    class_id = f"{transport}-{uuid.uuid4().hex[:8]}"
+    await client.create_classroom(class_id, class_id)
+
+    if transport == "rest":
+        teacher = client.subscribe(class_id)
+    else:
+        teacher = await client.connect(class_id)
+
+    async def follow():
+        async for payload in teacher:
+            run.watch(payload, time.perf_counter())
+    follower = asyncio.ensure_future(follow())
+    await asyncio.sleep(0.5) # stream connected and snapshot read
+
+    names = iter(range(students))
+    async def worker():
+        for n in names: # shared iterator: each student once
+            signal_type = SIGNAL_TYPES[n % len(SIGNAL_TYPES)]
+            if transport == "rest":
+                await student_rest(client, run, class_id, f"s{n}", signal_type)
+            else:
+                await student_ws(client, teacher, run, class_id, f"s{n}", signal_type)
+
+    cpu_start = cpu_seconds(pid)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    cpu = cpu_seconds(pid) - cpu_start
+
+    follower.cancel()
+    if transport == "rest":
+        teacher.close()
+    else:
+        await teacher.close()
+    await client.close()
+    return run.report(transport, students, cpu, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare REST/SSE and WebSocket transports")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8, help="students in flight at once")
+    parser.add_argument("--transports", default="rest,ws")
+    parser.add_argument("--port", type=int, default=5086)
+    args = parser.parse_args()
+
+    server = Server(args.port)
+    try:
+        for transport in args.transports.split(","):
+            result = asyncio.run(bench(args.port, transport, args.students, args.concurrency, server.proc.pid))
+            print(json.dumps(result), flush=True)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+# Rolled-up signal history for dashboards ("restroom requests per period this
+# week"), kept after the signals themselves are acknowledged and gone.
+#
+# Every signal and acknowledgement is counted into fixed-size buckets at three
+# resolutions at once: minutes for the last day, hours for five weeks and days
+# for a bit over a year. Each tier keeps only its newest `retention` buckets,
+# so the finer history downsamples itself by expiring while the coarser tiers
+# still hold it, and memory is bounded by active series per bucket, not by how
+# many signals were sent.
+#
+# A bucket maps class id -> signal type -> one row of counters (layout below).
+# Class id None is the whole-school total, kept alongside so queries across
+# every classroom read one series instead of adding them all up. Queries only
+# sum the rows of the buckets in their window; raw events are never kept.
+# Like the limiter, counts are per process when running several workers.
+
+ACK_BUCKETS = (5, 10, 30, 60, 120, 300, 600, 1800) # seconds from signal to acknowledge
+
+# Counter row layout: signals, acknowledged, total seconds to acknowledge, then
+# one count per ACK_BUCKETS bound plus one for anything slower
+SIGNALS, ACKED, ACK_SECONDS, ACK_HISTOGRAM = 0, 1, 2, 3
+ROW_SIZE = ACK_HISTOGRAM + len(ACK_BUCKETS) + 1
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+class Tier:
+    def __init__(self, resolution, retention):
+        self.resolution = resolution # seconds per bucket
+        self.retention = retention # buckets kept
+        self.buckets = OrderedDict() # slot -> {class_id: {signal_type: row}}
+        self.newest = None # newest slot seen
+
+    def covers(self, since, now):
+        return since >= (self._slot(now) - self.retention + 1) * self.resolution
+
+    def _slot(self, when):
+        return int(when // self.resolution)
+
+    def row(self, when, class_id, signal_type):
+        # The counter row to add to, or None if `when` is older than this tier keeps
+        slot = self._slot(when)
+        bucket = self.buckets.get(slot)
+        if bucket is None:
+            if self.newest is not None and slot <= self.newest - self.retention:
+                return None
+            # Events arrive in time order give or take a request, so new slots
+            # go on the back and the oldest are at the front
+            bucket = self.buckets[slot] = {}
+            self.newest = slot if self.newest is None else max(self.newest, slot)
+            while next(iter(self.buckets)) <= self.newest - self.retention:
+                self.buckets.popitem(last=False)
+        types = bucket.get(class_id)
+        if types is None:
+            types = bucket[class_id] = {}
+        row = types.get(signal_type)
+        if row is None:
+            row = types[signal_type] = [0] * ROW_SIZE
+        return row
+
+    def rows(self, class_id, since, until):
+        # (bucket start, {signal_type: row}) for every non-empty bucket in [since, until).
+        # Walks the buckets held (at most `retention`), not every slot in the range.
+        first, last = self._slot(since), self._slot(until - 1e-9)
+        for slot in sorted(slot for slot in self.buckets if first <= slot <= last):
+            bucket = self.buckets[slot]
+            if class_id in bucket:
+                yield slot * self.resolution, bucket[class_id]
+
+
+class SignalRollups:
+    def __init__(self):
+        self.tiers = [
+            # One bucket over a day, so the default day-long window still reads minutes
+            Tier(RESOLUTIONS["minute"], 24 * 60 + 1),
+            Tier(RESOLUTIONS["hour"], 35 * 24),
+            Tier(RESOLUTIONS["day"], 400),
+        ]
+        self._lock = threading.Lock()
+
+    def record_signal(self, class_id, signal_type, when):
+        with self._lock:
+            for tier in self.tiers:
+                for series in (class_id, None):
+                    row = tier.row(when, series, signal_type)
+                    if row is not None:
+                        row[SIGNALS] += 1
+
+    def record_ack(self, class_id, signal_type, sent, when):
+        # Counted in the bucket of the acknowledgement, with how long it waited
+        waited = max(0.0, when - sent)
+        index = ACK_HISTOGRAM + bisect.bisect_left(ACK_BUCKETS, waited)
+        with self._lock:
+            for tier in self.tiers:
+                for series in (class_id, None):
+                    row = tier.row(when, series, signal_type)
+                    if row is None:
+                        continue
+                    row[ACKED] += 1
+                    row[ACK_SECONDS] += waited
+                    row[index] += 1
+
+    def pick_tier(self, since, now, resolution=None):
+        # The finest tier (or the one asked for) that still holds `since`; None if none does
+        for tier in self.tiers:
+            if resolution is not None and tier.resolution != resolution:
+                continue
+            if tier.covers(since, now):
+                return tier
+        return None
+
+    def counts(self, tier, class_id, since, until, signal_type=None):
+        # Per-type totals for the window, plus the same per bucket
+        totals = {}
+        series = []
+        with self._lock:
+            for start, types in tier.rows(class_id, since, until):
+                bucket = {}
+                for name, row in types.items():
+                    if signal_type is not None and name != signal_type:
+                        continue
+                    total = totals.setdefault(name, {"signals": 0, "acknowledged": 0})
+                    total["signals"] += row[SIGNALS]
+                    total["acknowledged"] += row[ACKED]
+                    if row[SIGNALS]:
+                        bucket[name] = row[SIGNALS]
+                if bucket:
+                    series.append({"start": start, "signals": bucket})
+        return totals, series
+
+    def ack_times(self, tier, class_id, since, until, signal_type=None):
+        # Time-to-acknowledge distribution for the window, from the histogram columns
+        histogram = [0] * (len(ACK_BUCKETS) + 1)
+        count = 0
+        seconds = 0.0
+        with self._lock:
+            for _, types in tier.rows(class_id, since, until):
+                for name, row in types.items():
+                    if signal_type is not None and name != signal_type:
+                        continue
+                    count += row[ACKED]
+                    seconds += row[ACK_SECONDS]
+                    for i in range(len(histogram)):
+                        histogram[i] += row[ACK_HISTOGRAM + i]
+
+        bounds = list(ACK_BUCKETS) + [None] # None: slower than the last bound
+        return {
+            "count": count,
+            "mean_seconds": round(seconds / count, 1) if count else None,
+            # Upper bound of the bucket each percentile falls in
+            "p50_seconds": _quantile(bounds, histogram, count, 0.5),
+            "p90_seconds": _quantile(bounds, histogram, count, 0.9),
+            "buckets": [{"le": bound, "count": n} for bound, n in zip(bounds, histogram)],
+        }
+
+    def __len__(self):
+        # Buckets held across all tiers, for /metrics
+        with self._lock:
+            return sum(len(tier.buckets) for tier in self.tiers)
+
+
+def _quantile(bounds, histogram, count, q):
+    if not count:
+        return None
+    cumulative = 0
+    for bound, n in zip(bounds, histogram):
+        cumulative += n
+        if cumulative >= q * count:
+            return bound
+    return None
@@ -1,19 +1,118 @@
-from flask import Flask, Response, request, jsonify
+from flask import Flask, Response, request, jsonify, redirect, g
 from flask_cors import CORS
-import queue 
+import os
+import json
+import time
+import hashlib
+import math
+import tempfile
+import threading
+from urllib.parse import quote
+from stream_hub import BroadcastHub, COALESCE
+from event_log import EventLog
+from state import MemoryState, SqliteState
+from archive import ClassroomArchive
+from broker import LocalBroker, SocketBroker
+from coalescer import Coalescer
+from events import EventSchema, URGENT, HIGH, NORMAL
+from rate_limit import SignalLimiter
+from analytics import SignalRollups, RESOLUTIONS
+from response_cache import ResponseCache
+from metrics import Histogram, render_values
+
+STREAM_HOST = "127.0.0.1"
+STREAM_PORT = 5001 # event-loop hub that serves the teacher SSE streams
+SUBSCRIBER_QUEUE_SIZE = 256 # pending events kept per teacher connection
+# A teacher that falls behind gets a fresh snapshot in place of its backlog;
+# dropping single deltas would leave its view wrong until it reconnected
+OVERFLOW_POLICY = COALESCE # or DROP_OLDEST / DISCONNECT, see stream_hub.py
+DATA_DIR = os.environ.get("HANDRAISE_DATA_DIR") # set to keep classrooms across restarts
+
+# Multi-process mode: HANDRAISE_WORKERS > 1 shares state through SQLite and
+# events through Unix sockets in DATA_DIR (or the current directory)
+WORKERS = int(os.environ.get("HANDRAISE_WORKERS", "1"))
+
+# Idle classrooms are archived to disk and loaded back on their next request.
+# The archive lives in DATA_DIR/archive, or a scratch directory when nothing
+# is persisted (then it is only swap and starts empty on every boot).
+CLASSROOM_TTL = 4 * 60 * 60 # seconds without reads or writes before a classroom is archived
+MAX_HOT_CLASSROOMS = 1000 # beyond this, the least recently used are archived too
+REAP_INTERVAL = 60 # seconds between eviction passes
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True) # Allows requests from other apps 
 
 #teachers visit /classrooms/<class_id>/stream 
-classrooms = {
-        "test" : { 
-            "name": "Class 101",
-            "teacher_queues" : [], #subscribers, where signals are sent 
-            "students": [], #connected students information 
-            "signals" : [], 
-        }, 
-    }
+if WORKERS > 1:
+    shared_dir = DATA_DIR or "."
+    state = SqliteState(os.path.join(shared_dir, "handraise.sqlite3"))
+else:
+    archive_dir = os.path.join(DATA_DIR, "archive") if DATA_DIR else tempfile.mkdtemp(prefix="handraise-archive-")
+    state = MemoryState(EventLog(DATA_DIR) if DATA_DIR else None, ClassroomArchive(archive_dir))
+state.create("test", "Class 101")
+
+# New teacher streams open with a snapshot event, then receive every change
+# as a compact delta event (see events.py). The hub also serves the classroom
+# WebSockets, whose requests come back here (handle_socket_message).
+hub = BroadcastHub(
+    STREAM_HOST, STREAM_PORT, state.exists,
+    queue_size=SUBSCRIBER_QUEUE_SIZE, overflow=OVERFLOW_POLICY, reuse_port=WORKERS > 1,
+    snapshot=lambda class_id: [schema.snapshot(state.snapshot(class_id))],
+    handle_message=lambda class_id, message: handle_socket_message(class_id, message),
+)
+broker = LocalBroker(hub)
+# Batches bursts of signals per classroom (window set with "coalesce_ms" at create)
+coalescer = Coalescer(lambda class_id, payload, priority: broker.publish(class_id, payload, priority))
+
+# Per-student send limits: a burst of SIGNAL_BURST, then one every 1/SIGNAL_RATE
+# seconds; the same signal type again within DUPLICATE_WINDOW seconds is dropped
+SIGNAL_RATE = 0.2
+SIGNAL_BURST = 5
+DUPLICATE_WINDOW = 10 # 0 turns duplicate suppression off
+limiter = SignalLimiter(SIGNAL_RATE, SIGNAL_BURST, DUPLICATE_WINDOW)
+
+# Signal counts and acknowledge times, rolled up by minute/hour/day (see analytics.py)
+analytics = SignalRollups()
+ANALYTICS_WINDOW = 24 * 60 * 60 # default query window, seconds back from now
+
+# Classroom GET bodies, kept serialized until the classroom changes (see response_cache.py)
+response_cache = ResponseCache()
+PAGE_SIZE = 100 # default ?limit= for paged roster and signal reads
+MAX_PAGE_SIZE = 1000
+
+# Every state change goes to the teachers' streams, in the order it was applied
+def publish_change(class_id, delta):
+    start = time.perf_counter()
+    priority = delta["signal"]["priority"] if delta["op"] == "signal" else NORMAL
+    coalescer.submit(class_id, schema.delta(delta), state.coalesce_window(class_id), priority)
+    publish_latency.observe(time.perf_counter() - start)
+
+state.on_change = publish_change
+
+# --- METRICS ---
+
+route_latency = Histogram(
+    "handraise_request_duration_seconds", "Request latency by route", ("method", "route", "status")
+)
+socket_latency = Histogram(
+    "handraise_socket_request_duration_seconds", "WebSocket request latency by op", ("op", "status")
+)
+publish_latency = Histogram(
+    "handraise_signal_publish_seconds", "Time spent handing a classroom change to the stream fan-out"
+)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        # url_rule is the route template, so labels stay bounded no matter how many classrooms exist
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        route_latency.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+    return response
 
 signal_types = {
             "pencil" : "I need a sharpened pencil",
@@ -26,150 +125,514 @@ signal_types = {
             "move" : "I want to move seats"
         }
 
+# Delivery lane per signal type (see events.py); unlisted types are NORMAL.
+# URGENT signals are also never rate limited.
+signal_priorities = {
+            "emergency" : URGENT,
+            "sick" : HIGH,
+            "restroom" : HIGH,
+        }
+
+# The catalog never changes while the server runs: serialize it and tag it once
+signal_types_body = json.dumps(signal_types)
+signal_types_etag = hashlib.sha1(signal_types_body.encode()).hexdigest()[:16]
+
+# Stream events refer to signal types by their position in the catalog
+schema = EventSchema(signal_types, signal_priorities)
+
+# Answer a GET with 304 if the client already holds this ETag, else with the body
+# from make_body(). Clients must revalidate each time (no-cache), but only pay
+# for the bytes when something changed.
+def conditional(etag, make_body):
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = make_body()
+        if isinstance(body, tuple): # an error response instead of a body
+            return body
+        response = Response(body if isinstance(body, (str, bytes)) else json.dumps(body), mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 # --- GET data ---
 
+# conditional() for a classroom read, JSON-encoded once per classroom version
+# and served from response_cache until the next change. `key` tells apart the
+# different bodies of one classroom (full list, each page, each since=).
+# make_body() returning None means the changes asked for are gone: 410.
+def cached(class_id, key, make_body):
+    # Version is read before the body: a racing write can only make the body newer
+    # than its tag, which just costs the client one extra refetch
+    etag = state.version(class_id)
+
+    def body():
+        data = response_cache.get(class_id, etag, key, lambda: encode(make_body()))
+        return data if data is not None else ("Too far behind: fetch the full list again", 410)
+    return conditional(etag, body)
+
+def encode(body):
+    return json.dumps(body).encode() if body is not None else None
+
+# Large classes: instead of the whole list, a client can ask for
+#   ?limit=N&cursor=C  one page; C is the next_cursor of the page before (none for the first)
+#   ?since=V           only the changes after version V, the ETag or "version" of an
+#                      earlier response; 410 if that is too old (or from before a restart)
+# Returns ((limit, cursor, since), None) or (None, error response), like analytics_query().
+def list_query(parse_cursor):
+    limit, cursor, since = (request.args.get(arg) for arg in ("limit", "cursor", "since"))
+    if since is not None and (limit is not None or cursor is not None):
+        return None, ("since can't be combined with limit or cursor", 400)
+    if limit is None and cursor is None:
+        return (None, None, since), None
+    try:
+        limit = int(limit) if limit is not None else PAGE_SIZE
+        cursor = parse_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        return None, ("limit must be a number and cursor a next_cursor from this list", 400)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return None, (f"limit must be between 1 and {MAX_PAGE_SIZE}", 400)
+    return (limit, cursor, since), None
+
+def changes_since(class_id, since, ops=None):
+    # Deltas (see state.py) after version `since`, only the ops given if any
+    def make_body():
+        version, deltas = state.changes(class_id, since)
+        if deltas is None:
+            return None
+        return {"version": version, "changes": [delta for delta in deltas if ops is None or delta["op"] in ops]}
+    return cached(class_id, ("since", ops, since), make_body)
+
+def list_read(class_id, view, ops, read_all, read_page, parse_cursor, format_cursor):
+    query, error = list_query(parse_cursor)
+    if error is not None:
+        return error
+    limit, cursor, since = query
+
+    if since is not None:
+        return changes_since(class_id, since, ops)
+    if limit is None:
+        return cached(class_id, (view,), lambda: read_all(class_id))
+
+    def make_body():
+        version, items, next_cursor = read_page(class_id, cursor, limit)
+        return {
+            "version": version, view: items,
+            "next_cursor": format_cursor(next_cursor) if next_cursor is not None else None,
+        }
+    return cached(class_id, (view, cursor, limit), make_body)
+
+# Signal cursors are the (priority, id) of the last signal on the page, as "priority-id"
+def parse_signal_cursor(cursor):
+    priority, signal_id = cursor.split("-")
+    return int(priority), int(signal_id)
+
 # Teacher: GET class info  
 @app.route("/classrooms/<class_id>")
 def get_class(class_id): #Path parameter 
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
-    
-    class_data = classrooms[class_id].copy()
-    class_data.pop("teacher_queues", None)  # remove queues before sending JSON
-    return jsonify(class_data), 200
 
+    since = request.args.get("since")
+    if since is not None:
+        return changes_since(class_id, since)
+    return cached(class_id, ("classroom",), lambda: state.classroom(class_id))
+
+# Student cursors are join numbers, so a page never skips anyone when others leave
 @app.route("/classrooms/<class_id>/students")
 def get_students(class_id):
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
-    
-    return jsonify(classrooms[class_id]["students"]), 200 
+
+    return list_read(class_id, "students", ("join", "leave"), state.students, state.students_page, int, str)
 
 @app.route("/classrooms/<class_id>/signals")
 def get_signals(class_id):
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
-    
-    return jsonify(classrooms[class_id]["signals"]), 200 
+
+    return list_read(
+        class_id, "signals", ("signal", "ack"), state.signals, state.signals_page,
+        parse_signal_cursor, lambda key: f"{key[0]}-{key[1]}",
+    )
 
 @app.route("/signal-types")
 def get_signal_types():
-    return jsonify(signal_types), 200 
+    return conditional(signal_types_etag, lambda: signal_types_body)
+
+# Dashboards: read the rollups for [since, until) (unix seconds, default the
+# last ANALYTICS_WINDOW), for one classroom or all of them, optionally one type.
+# Returns ((tier, class_id, since, until, signal_type), None) or (None, error response).
+def analytics_query():
+    now = time.time()
+    try:
+        until = float(request.args.get("until", now))
+        since = float(request.args.get("since", until - ANALYTICS_WINDOW))
+    except ValueError:
+        return None, ("since and until must be unix timestamps", 400)
+    if not (math.isfinite(since) and math.isfinite(until)):
+        return None, ("since and until must be unix timestamps", 400)
+    until = min(until, now) # nothing is counted past now
+    if since >= until:
+        return None, ("since must be before until", 400)
+
+    resolution = request.args.get("resolution")
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return None, ("resolution must be minute, hour or day", 400)
+
+    tier = analytics.pick_tier(since, now, RESOLUTIONS.get(resolution))
+    if tier is None:
+        return None, ("No history kept that far back at that resolution", 400)
+
+    signal_type = request.args.get("type")
+    if signal_type is not None and signal_type not in signal_types:
+        return None, ("Unknown signal type", 404)
+    return (tier, request.args.get("class_id"), since, until, signal_type), None
+
+@app.route("/analytics/signals")
+def get_signal_counts():
+    query, error = analytics_query()
+    if error is not None:
+        return error
+    tier, class_id, since, until, signal_type = query
+
+    totals, series = analytics.counts(tier, class_id, since, until, signal_type)
+    return {
+        "class_id" : class_id, "since" : since, "until" : until, "resolution" : tier.resolution,
+        "types" : totals, "series" : series,
+    }, 200
+
+@app.route("/analytics/ack-times")
+def get_ack_times():
+    query, error = analytics_query()
+    if error is not None:
+        return error
+    tier, class_id, since, until, signal_type = query
+
+    result = analytics.ack_times(tier, class_id, since, until, signal_type)
+    return {"class_id" : class_id, "since" : since, "until" : until, "resolution" : tier.resolution, **result}, 200
+
+# Ops: slow-consumer counters from the stream hub
+@app.route("/streams/stats")
+def get_stream_stats():
+    return jsonify({"overflow_policy": hub.overflow, **hub.stats}), 200 
+
+# Ops: Prometheus scrape endpoint (per process when running several workers)
+@app.route("/metrics")
+def get_metrics():
+    classroom_count, student_count, signal_count = state.totals()
+    streams = hub.stream_metrics()
+    stats = hub.stats
+
+    lines = []
+    lines += render_values("handraise_classrooms", "Classrooms in memory", "gauge", {(): classroom_count})
+    lines += render_values("handraise_students", "Students joined across all classrooms", "gauge", {(): student_count})
+    lines += render_values("handraise_pending_signals", "Unacknowledged signals", "gauge", {(): signal_count})
+    if streams is not None: # None: the hub loop was too busy to count, skip these this scrape
+        lines += render_values(
+            "handraise_stream_subscribers", "Live teacher streams per classroom", "gauge",
+            {(("class_id", class_id),): subs for class_id, (subs, _) in streams.items()},
+        )
+        lines += render_values(
+            "handraise_stream_queue_depth", "Deepest subscriber queue per classroom", "gauge",
+            {(("class_id", class_id),): depth for class_id, (_, depth) in streams.items()},
+        )
+    lines += render_values(
+        "handraise_stream_queue_depth_max", "Deepest any subscriber queue has been", "gauge",
+        {(): stats["max_queue_depth"]},
+    )
+    lines += render_values("handraise_stream_connects_total", "Teacher stream connects", "counter", {(): stats["connects"]})
+    lines += render_values(
+        "handraise_stream_disconnects_total", "Teacher stream disconnects", "counter", {(): stats["disconnects"]}
+    )
+    lines += render_values(
+        "handraise_stream_overflow_total",
+        "Slow-consumer handling: events dropped, backlogs coalesced, subscribers evicted or reaped", "counter",
+        {(("kind", kind),): stats[kind] for kind in ("dropped", "coalesced", "evicted", "reaped")},
+    )
+    if isinstance(state, MemoryState):
+        lines += render_values(
+            "handraise_classroom_archive_total", "Classrooms moved to and loaded back from the archive", "counter",
+            {(("kind", kind),): count for kind, count in state.stats.items()},
+        )
+    lines += render_values(
+        "handraise_signals_rejected_total", "Signals refused by the per-student limiter", "counter",
+        {(("reason", reason),): count for reason, count in limiter.stats.items()},
+    )
+    lines += render_values(
+        "handraise_response_cache_total", "Classroom reads served from / built into the response cache", "counter",
+        {(("result", result),): count for result, count in response_cache.stats.items()},
+    )
+    lines += render_values(
+        "handraise_response_cache_bodies", "Serialized classroom bodies held", "gauge", {(): len(response_cache)}
+    )
+    lines += render_values(
+        "handraise_analytics_buckets", "Rollup buckets held across all resolutions", "gauge", {(): len(analytics)}
+    )
+    lines += route_latency.render()
+    lines += socket_latency.render()
+    lines += publish_latency.render()
+    lines += hub.fanout_seconds.render()
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
 
 # Teacher: POST classroom
 @app.route("/classrooms/<class_id>/create", methods = ["POST"])
 def create_classroom(class_id): 
     data = request.get_json()
+    coalesce_ms = data.get("coalesce_ms", 0) # optional: batch signal bursts for this long
+
+    if type(coalesce_ms) is not int or not 0 <= coalesce_ms <= 5000: # bool is an int too
+        return "coalesce_ms must be 0-5000", 400
 
-    if class_id in classrooms:
+    if not state.create(class_id, data["name"], coalesce_ms):
         return "Class already exists", 409
-    
-    classrooms[class_id] = {
-        "name": data["name"], #for UI 
-        "teacher_queues" : [], #subscribers, where signals are sent 
-        "students": [], #connected students 
-        "signals" : []
-    }
 
-    class_data = classrooms[class_id].copy()
-    class_data.pop("teacher_queues", None)  # remove queues before sending JSON
-    return jsonify(class_data), 201
+    return jsonify(state.classroom(class_id)), 201
 
 # Student: POST student  
 @app.route("/classrooms/<class_id>/join", methods = ["POST"])
 def join_classroom(class_id):
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
 
     data = request.get_json()
+    return join_student(class_id, data.get("name"))
+
+# The operations below are shared by the REST routes and the WebSocket
+# endpoint (see handle_socket_message). The caller has already checked that
+# the classroom exists; each returns (body, status[, headers]).
 
-    name = data.get("name")
+# Names come straight from JSON bodies: anything but a non-empty string is refused
+def is_name(name):
+    return isinstance(name, str) and name != ""
 
-    if not name:
+def join_student(class_id, name):
+    if not is_name(name):
         return "Name required", 400
     
-    if name in classrooms[class_id]["students"]:
+    count = state.join(class_id, name)
+    if count is None:
         return "Student already in class", 400
 
-    classrooms[class_id]["students"].append(name) 
+    return {"joined" : name, "count" : count}, 201 
 
-    return jsonify(classrooms[class_id]["students"]), 201 
+# LMS sync: POST a whole roster change at once 
+# body: {"join": [names...], "leave": [names...]}
+@app.route("/classrooms/<class_id>/roster", methods = ["POST"])
+def bulk_roster(class_id):
+    if not state.exists(class_id):
+        return "Classroom not found", 404
+
+    data = request.get_json()
+    to_join = data.get("join", [])
+    to_leave = data.get("leave", [])
+
+    if not isinstance(to_join, list) or not isinstance(to_leave, list):
+        return "join and leave must be lists of names", 400
+    if not all(is_name(name) for name in to_join + to_leave):
+        return "Names must be non-empty strings", 400
+
+    joined, left, count = state.sync_roster(class_id, to_join, to_leave)
+
+    return {"joined" : joined, "left" : left, "count" : count}, 200 
 
 # Student: POST transmit signal 
 @app.route("/classrooms/<class_id>/signal", methods = ["POST"])
 def send_signal(class_id):
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
 
     data = request.get_json()
-    student = data.get("name")
-    signal_type = data.get("signal_type")
+    # Clients that retry send the same Idempotency-Key, so a retry never shows up twice
+    key = request.headers.get("Idempotency-Key")
+    return add_signal(class_id, data.get("name"), data.get("signal_type"), key)
 
-    if signal_type not in signal_types:
+def add_signal(class_id, student, signal_type, key=None):
+    if student is not None and not is_name(student):
+        return "Name must be a non-empty string", 400
+
+    if not isinstance(signal_type, str) or signal_type not in signal_types:
         return "Cannot send that kind of signal", 404 
     
-    text = signal_types[signal_type]
-    msg = f"{student}: {text}"
+    if key is not None and not (isinstance(key, str) and 0 < len(key) <= 128):
+        return "Idempotency-Key must be 1-128 characters", 400
+
+    # A retry of a signal we already took is answered before the limiter sees it
+    record = state.find_key(class_id, key) if key is not None else None
+    if record is not None:
+        return {"status" : "duplicate", "id" : record["id"]}, 200
+
+    priority = signal_priorities.get(signal_type, NORMAL)
+    if priority != URGENT:
+        refused = limiter.check(class_id, student, signal_type)
+        if refused is not None:
+            reason, retry_after = refused
+            # 429: slow down and try again later; 409: the same signal is already with the teacher
+            status = 429 if reason == "rate_limited" else 409
+            body = {"status" : reason, "retry_after" : round(retry_after, 1)}
+            return body, status, {"Retry-After": str(math.ceil(retry_after))}
 
-    classrooms[class_id]["signals"].append(msg)
-
-    for q in classrooms[class_id]["teacher_queues"]:
-        q.put(msg)
+    text = signal_types[signal_type]
+    record, created = state.add_signal(class_id, student, signal_type, text, key, priority)
+    if not created:
+        return {"status" : "duplicate", "id" : record["id"]}, 200
 
-    return {"status" : "sent"}, 201
+    analytics.record_signal(class_id, signal_type, record["time"])
+    return {"status" : "sent", "id" : record["id"]}, 201
 
 # --- DELETE ---
 
-# Teacher: Waive signal 
+# Teacher: Waive signal by id 
 @app.route("/classrooms/<class_id>/signal/remove", methods = ["DELETE"])
 def remove_signal_from_queue(class_id):
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
     
     data = request.get_json()
-    signal = data["signal"]
-    signals = classrooms[class_id]["signals"]
+    return acknowledge_signal(class_id, data.get("id"))
 
-    if signal in signals:
-        signals.remove(signal) 
-    return jsonify(signals), 200
+def acknowledge_signal(class_id, signal_id):
+    if type(signal_id) is not int: # not isinstance: JSON true/false are ints too
+        return "Signal id required", 400
+
+    record = state.acknowledge(class_id, signal_id)
+    if record is None:
+        return "Signal not found", 404
+
+    analytics.record_ack(class_id, record["type"], record["time"], time.time())
+    return record, 200
 
 # Student: Leave classroom 
 @app.route("/classrooms/<class_id>/leave", methods = ["DELETE"])
 def remove_student(class_id):
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
     
     data = request.get_json() 
-    name = data["name"]
+    return leave_student(class_id, data["name"])
+
+def leave_student(class_id, name):
+    if not is_name(name):
+        return "Name required", 400
 
-    classrooms[class_id]["students"].remove(name) 
+    if not state.leave(class_id, name):
+        return "Student not in class", 404
 
     return {"deleted" : name}, 200
 
+# --- WEBSOCKET ---
+
+# Requests sent on a classroom WebSocket (ws://<host>:STREAM_PORT/classrooms/<id>/ws),
+# as JSON messages with an "op" and the same fields as the REST bodies:
+#   {"op": "join" | "leave", "name"}
+#   {"op": "signal", "name", "signal_type", "key"}   key: like Idempotency-Key
+#   {"op": "ack", "id"}
+# plus an optional "ref" the reply echoes. They run the same code as the routes.
+socket_operations = {
+    "join" : lambda class_id, message: join_student(class_id, message.get("name")),
+    "leave" : lambda class_id, message: leave_student(class_id, message.get("name")),
+    "signal" : lambda class_id, message: add_signal(
+        class_id, message.get("name"), message.get("signal_type"), message.get("key")
+    ),
+    "ack" : lambda class_id, message: acknowledge_signal(class_id, message.get("id")),
+}
+
+# Called on the hub's worker threads; returns (status, body) for the reply
+def handle_socket_message(class_id, message):
+    op = message.get("op")
+    operation = socket_operations.get(op) if isinstance(op, str) else None
+    if operation is None:
+        return 400, "Unknown op"
+    if not state.exists(class_id):
+        return 404, "Classroom not found"
+
+    start = time.perf_counter()
+    body, status = operation(class_id, message)[:2]
+    socket_latency.observe(time.perf_counter() - start, op, str(status))
+    return status, body
+
 # --- STREAM --- 
 
 # Teachers: Connect and stay connected for signals 
+# The stream itself is served by the hub's event loop, so an open connection
+# costs a coroutine instead of a server thread. Old clients that hit this URL
+# are redirected there with the same path.
 @app.route("/classrooms/<class_id>/stream")
 def classroom_stream(class_id):
-    if class_id not in classrooms:
+    if not state.exists(class_id):
         return "Classroom not found", 404
 
-    q = queue.Queue()
-    classrooms[class_id]["teacher_queues"].append(q)
+    host = request.host.split(":")[0]
+    return redirect(f"http://{host}:{STREAM_PORT}/classrooms/{quote(class_id, safe='')}/stream", code=307)
+
+# Same for the classroom WebSocket, for clients that only know the API's address
+# (browsers' WebSocket doesn't follow redirects: connect to the hub directly)
+@app.route("/classrooms/<class_id>/ws")
+def classroom_socket(class_id):
+    if not state.exists(class_id):
+        return "Classroom not found", 404
 
-    def event_stream(q):
-        yield b"data: connected\n\n"  # <- string, not bytes
+    host = request.host.split(":")[0]
+    query = request.query_string.decode()
+    location = f"http://{host}:{STREAM_PORT}/classrooms/{quote(class_id, safe='')}/ws" + (f"?{query}" if query else "")
+    return redirect(location, code=307)
 
+# Background reaper: archive idle classrooms, except ones a teacher is streaming
+def reap_classrooms():
+    while True:
+        time.sleep(REAP_INTERVAL)
         try:
-            while True:
-                msg = q.get()
-                yield f"data: {msg}\n\n"
-        except GeneratorExit:
-            classrooms[class_id]["teacher_queues"].remove(q)
-            print(f"Teacher disconnected from {class_id}")
-
-    return Response(event_stream(q), mimetype="text/event-stream")
+            evicted = state.evict_idle(
+                CLASSROOM_TTL, MAX_HOT_CLASSROOMS, in_use=lambda class_id: hub.subscriber_count(class_id) > 0
+            )
+        except Exception as e: # e.g. disk full: keep everything in memory and try again next pass
+            print(f"Archiving idle classrooms failed: {e!r}")
+            continue
+        for class_id in evicted:
+            hub.forget(class_id)
+            response_cache.forget(class_id)
+        if evicted:
+            print(f"Archived {len(evicted)} idle classrooms")
+
+# Start the background pieces of one serving process
+def start_services():
+    global broker
+    if isinstance(state, MemoryState) and state.event_log is not None:
+        print(f"Recovered {state.recover()} classrooms from {DATA_DIR}")
+    hub.start()
+    coalescer.start()
+    if isinstance(state, MemoryState): # SQLite already keeps classrooms on disk
+        threading.Thread(target=reap_classrooms, name="reaper", daemon=True).start()
+    if WORKERS > 1:
+        broker = SocketBroker(hub, state, os.path.join(DATA_DIR or ".", "handraise-bus"))
+        broker.start()
+
+# Fork WORKERS processes that share one listening socket (werkzeug's fd= mode);
+# each gets its own stream hub on the shared STREAM_PORT and joins the broker
+def run_workers():
+    import socket
+    from werkzeug.serving import make_server
+
+    listener = socket.create_server(("127.0.0.1", 5000), backlog=1024)
+    children = []
+    for _ in range(WORKERS):
+        pid = os.fork()
+        if pid == 0:
+            start_services()
+            make_server("127.0.0.1", 5000, app, threaded=True, fd=listener.fileno()).serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    print(f"Serving on 127.0.0.1:5000 with {WORKERS} workers")
+    for pid in children:
+        os.waitpid(pid, 0)
 
 if __name__ == "__main__":
-    app.run(debug=True, threaded=True)
\ No newline at end of file
+    if WORKERS > 1:
+        run_workers()
+    else:
+        # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_services()
+        app.run(debug=True, threaded=True)
\ No newline at end of file
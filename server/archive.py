@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+from urllib.parse import quote, unquote
+
+# Cold storage for classrooms evicted from memory.
+#
+# One gzipped JSON file per classroom, in the same shape as an event log
+# snapshot entry plus its version:
+#   {"name", "coalesce_ms", "version", "students": [name, ...], "signals": [record, ...]}
+# Files are written to a temp name, fsynced and renamed into place, so a
+# crash mid-write leaves the previous archive intact.
+#
+# Archived classrooms drop out of the event log, so the log alone can't tell
+# recovery which signal IDs are still taken. The archive keeps the highest
+# signal ID it holds in a side file (last_signal_id) for that.
+#
+# The ids with a file are also kept in memory (read from the directory once),
+# so asking about a classroom that was never archived never touches the disk.
+
+LAST_ID_FILE = "last-signal-id"
+
+
+class ClassroomArchive:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, LAST_ID_FILE)) as f:
+                self.last_signal_id = int(f.read())
+        except FileNotFoundError:
+            self.last_signal_id = 0
+        self.ids = {unquote(name[:-len(".json.gz")]) for name in os.listdir(directory) if name.endswith(".json.gz")}
+
+    def _path(self, class_id):
+        # Class ids come from URLs: quote them so any id is one safe file name
+        return os.path.join(self.directory, quote(class_id, safe="") + ".json.gz")
+
+    def save(self, class_id, data):
+        # Callers save one classroom at a time (MemoryState's archive lock)
+        last_id = max((record["id"] for record in data["signals"]), default=0)
+        if last_id > self.last_signal_id:
+            # Before the classroom itself, so no archived ID is ever above the mark
+            _write_atomically(os.path.join(self.directory, LAST_ID_FILE), str(last_id).encode())
+            self.last_signal_id = last_id
+        _write_atomically(self._path(class_id), gzip.compress(json.dumps(data, separators=(",", ":")).encode()))
+        self.ids.add(class_id)
+
+    def load(self, class_id):
+        # The archived classroom, or None if it was never evicted
+        if class_id not in self.ids:
+            return None
+        try:
+            with gzip.open(self._path(class_id), "rt") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def __contains__(self, class_id):
+        return class_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _write_atomically(path, data):
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,96 @@
+import glob
+import json
+import os
+import socket
+import threading
+import time
+
+from events import NORMAL
+
+# Delivery of stream events to the hub(s) that hold teacher connections.
+#
+# LocalBroker hands events straight to this process's hub. SocketBroker is
+# for several worker processes sharing a SqliteState: every worker binds a
+# Unix datagram socket in a shared directory and a publish is sent to all of
+# them (itself included), so a teacher streaming from worker B sees a signal
+# posted to worker A. Sequence numbers come from the shared store so every
+# worker's replay buffer agrees on event IDs.
+#
+# A datagram holds at most MAX_DATAGRAM bytes. Payloads are lists of events
+# (see coalescer.py), so a batch too big for one, like a bulk roster sync,
+# goes out split over several events instead of being truncated.
+
+PEER_REFRESH = 1.0 # seconds between rescans of the socket directory
+MAX_DATAGRAM = 65536
+
+
+class LocalBroker:
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, class_id, payload, priority=NORMAL):
+        self.hub.publish(class_id, payload, priority=priority)
+
+
+class SocketBroker:
+    def __init__(self, hub, state, directory):
+        self.hub = hub
+        self.state = state # needs next_seq(class_id), i.e. SqliteState
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}.sock")
+        self._peers = []
+        self._peers_at = 0
+        self._send = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send.settimeout(1.0) # a wedged worker must not hang request handlers
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        threading.Thread(target=self._receive_loop, args=(sock,), name="broker", daemon=True).start()
+
+    def _receive_loop(self, sock):
+        while True:
+            try:
+                class_id, seq, payload, priority = json.loads(sock.recv(MAX_DATAGRAM))
+                self.hub.publish(class_id, payload, seq=seq, priority=priority)
+            except Exception as e: # one bad datagram must not stop this worker's teachers getting events
+                print(f"Broker: dropped an event that could not be delivered: {e!r}")
+
+    def _current_peers(self):
+        now = time.monotonic()
+        if now - self._peers_at > PEER_REFRESH:
+            self._peers = glob.glob(os.path.join(self.directory, "*.sock"))
+            self._peers_at = now
+        return self._peers
+
+    def publish(self, class_id, payload, priority=NORMAL):
+        head, body = json.dumps(class_id), json.dumps(payload) # ASCII, so characters are bytes
+        if len(head) + len(body) + 32 > MAX_DATAGRAM: # 32: the brackets, seq and priority
+            if len(payload) > 1:
+                half = len(payload) // 2
+                self.publish(class_id, payload[:half], priority)
+                self.publish(class_id, payload[half:], priority)
+            else:
+                print(f"Broker: event for {class_id} is over {MAX_DATAGRAM} bytes, dropped")
+            return
+        datagram = f"[{head},{self.state.next_seq(class_id)},{body},{priority}]".encode()
+        for peer in self._current_peers():
+            try:
+                self._send.sendto(datagram, peer)
+            except socket.timeout:
+                print(f"Broker: {peer} is not receiving, event {class_id} dropped for it")
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker that exited without cleaning up its socket
+                try:
+                    os.remove(peer)
+                except FileNotFoundError:
+                    pass
+                self._peers_at = 0
+            except OSError as e: # e.g. "Message too long"
+                print(f"Broker: event for {class_id} not sent to {peer}: {e}")
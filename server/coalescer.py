@@ -0,0 +1,67 @@
+import heapq
+import threading
+import time
+
+from events import NORMAL
+
+# Folds bursts of stream events into one batched event per classroom.
+#
+# The first event of a burst opens a window; everything submitted for that
+# classroom until the window closes is published as one list of events,
+# i.e. one stream frame and one client update instead of thirty. Events
+# more urgent than NORMAL (emergencies, see events.py) never wait: they flush
+# whatever is pending and go out immediately, in their own priority lane.
+# A window of 0 publishes straight through.
+
+
+class Coalescer:
+    def __init__(self, publish):
+        self.publish = publish # publish(class_id, [event, ...], priority), e.g. broker.publish
+        self._pending = {} # class_id -> (deadline, [event, ...])
+        self._deadlines = [] # heap of (deadline, class_id)
+        self._cond = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._flush_loop, name="coalescer", daemon=True).start()
+
+    def submit(self, class_id, event, window, priority=NORMAL):
+        # window is in seconds; anything more urgent than NORMAL bypasses it
+        if priority < NORMAL:
+            with self._cond:
+                _, batch = self._pending.pop(class_id, (None, []))
+            if batch:
+                self.publish(class_id, batch, NORMAL)
+            self.publish(class_id, [event], priority)
+            return
+
+        if window <= 0:
+            self.publish(class_id, [event], NORMAL)
+            return
+
+        with self._cond:
+            pending = self._pending.get(class_id)
+            if pending is not None:
+                pending[1].append(event)
+                return
+            deadline = time.monotonic() + window
+            self._pending[class_id] = (deadline, [event])
+            heapq.heappush(self._deadlines, (deadline, class_id))
+            self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._deadlines:
+                    self._cond.wait()
+                deadline, class_id = self._deadlines[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._deadlines)
+                pending = self._pending.get(class_id)
+                if pending is None or pending[0] != deadline:
+                    continue # already flushed early by an urgent event
+                del self._pending[class_id]
+
+            self.publish(class_id, pending[1], NORMAL)
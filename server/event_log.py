@@ -0,0 +1,208 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+# Optional durability for classroom state.
+#
+# Every mutation is appended as one JSON line to the current log segment
+# (log-<n>.jsonl). A background writer batches whatever is queued and does a
+# single flush + fsync per batch (group commit), so request handlers only pay
+# for a queue.put. On a crash at most FLUSH_INTERVAL worth of events is lost.
+#
+# When a segment fills up the writer rolls to a new one and a compaction
+# thread folds the previous snapshot plus the closed segments into
+# snapshot-<n>.json. Startup loads the newest snapshot and replays only the
+# segments after it.
+#
+# State here is plain data, the same shape as the snapshot:
+#   {class_id: {"name": str, "coalesce_ms": int, "students": {name: None}, "signals": {id: record}}}
+
+FLUSH_INTERVAL = 0.05 # seconds to collect a batch before each fsync
+SEGMENT_EVENTS = 50000 # events per log segment before rolling + compacting
+
+
+def apply_event(state, event):
+    op = event["op"]
+    class_id = event["class"]
+
+    if op == "create": # like the route, creating an existing classroom is a no-op
+        state.setdefault(class_id, {
+            "name": event["name"], "coalesce_ms": event.get("coalesce_ms", 0), "students": {}, "signals": {}
+        })
+        return
+
+    if op == "restore": # loaded back from the classroom archive
+        state[class_id] = {
+            "name": event["name"], "coalesce_ms": event["coalesce_ms"],
+            "students": dict.fromkeys(event["students"]),
+            "signals": {record["id"]: record for record in event["signals"]},
+        }
+        return
+    if op == "evict": # moved to the classroom archive
+        state.pop(class_id, None)
+        return
+
+    classroom = state.get(class_id)
+    if classroom is None:
+        return
+    if op == "join":
+        classroom["students"][event["student"]] = None
+    elif op == "leave":
+        classroom["students"].pop(event["student"], None)
+    elif op == "signal":
+        classroom["signals"][event["signal"]["id"]] = event["signal"]
+    elif op == "ack":
+        classroom["signals"].pop(event["id"], None)
+
+
+def _index(path):
+    # log-12.jsonl / snapshot-12.json -> 12
+    return int(os.path.basename(path).split("-")[1].split(".")[0])
+
+
+class EventLog:
+    def __init__(self, directory, flush_interval=FLUSH_INTERVAL, segment_events=SEGMENT_EVENTS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.segment_events = segment_events
+        self._queue = queue.Queue()
+        self._compacting = threading.Lock()
+        self._segment = None
+        self._segment_index = None
+        self._segment_count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # --- files ---
+
+    def _snapshots(self):
+        return sorted(glob.glob(os.path.join(self.directory, "snapshot-*.json")), key=_index)
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "log-*.jsonl")), key=_index)
+
+    def _segment_path(self, index):
+        return os.path.join(self.directory, f"log-{index}.jsonl")
+
+    # --- recovery ---
+
+    def recover(self):
+        # Rebuild state from the newest snapshot plus the log segments written after it
+        state = {}
+        base = 0
+        snapshots = self._snapshots()
+        if snapshots:
+            base = _index(snapshots[-1])
+            with open(snapshots[-1]) as f:
+                state = self._load_snapshot(json.load(f))
+
+        for path in self._segments():
+            if _index(path) >= base:
+                self._replay(path, state)
+        return state
+
+    @staticmethod
+    def _load_snapshot(data):
+        return {
+            class_id: {
+                "name": classroom["name"],
+                "coalesce_ms": classroom.get("coalesce_ms", 0),
+                "students": dict.fromkeys(classroom["students"]),
+                "signals": {record["id"]: record for record in classroom["signals"]},
+            }
+            for class_id, classroom in data.items()
+        }
+
+    @staticmethod
+    def _replay(path, state):
+        with open(path) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break # torn write at the tail of the last segment before a crash
+                apply_event(state, event)
+
+    # --- writing ---
+
+    def start(self):
+        # New segment after anything already on disk, so a torn tail is never appended to
+        segments = self._segments()
+        self._open_segment(_index(segments[-1]) + 1 if segments else 1)
+        threading.Thread(target=self._write_loop, name="event-log", daemon=True).start()
+
+    def append(self, event):
+        event["ts"] = time.time()
+        self._queue.put(event)
+
+    def _open_segment(self, index):
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_index = index
+        self._segment_count = 0
+        self._segment = open(self._segment_path(index), "a")
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(self.flush_interval) # let concurrent requests join this commit
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._segment.write("".join(json.dumps(event) + "\n" for event in batch))
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._segment_count += len(batch)
+
+            if self._segment_count >= self.segment_events:
+                self._open_segment(self._segment_index + 1)
+                threading.Thread(target=self.compact, args=(self._segment_index,), daemon=True).start()
+
+    # --- compaction ---
+
+    def compact(self, upto):
+        # Fold the latest snapshot and every closed segment below `upto` into snapshot-<upto>
+        if not self._compacting.acquire(blocking=False):
+            return # a compaction is already running; the next roll will catch up
+        try:
+            state = {}
+            base = 0
+            snapshots = self._snapshots()
+            if snapshots:
+                base = _index(snapshots[-1])
+                with open(snapshots[-1]) as f:
+                    state = self._load_snapshot(json.load(f))
+
+            segments = [path for path in self._segments() if base <= _index(path) < upto]
+            for path in segments:
+                self._replay(path, state)
+
+            data = {
+                class_id: {
+                    "name": classroom["name"],
+                    "coalesce_ms": classroom["coalesce_ms"],
+                    "students": list(classroom["students"]),
+                    "signals": list(classroom["signals"].values()),
+                }
+                for class_id, classroom in state.items()
+            }
+            path = os.path.join(self.directory, f"snapshot-{upto}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+
+            # Everything below `upto` is now covered by the new snapshot
+            for old in snapshots:
+                os.remove(old)
+            for old in self._segments():
+                if _index(old) < upto:
+                    os.remove(old)
+        finally:
+            self._compacting.release()
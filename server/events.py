@@ -0,0 +1,120 @@
+import json
+
+from websocket import OP_PING, OP_TEXT, encode_frame
+
+try:
+    import msgpack
+except ImportError: # optional: only needed for binary stream subscribers
+    msgpack = None
+
+# Stream event schema.
+#
+# Events are positional arrays: no key names, no classroom id and no signal
+# text repeat on every event. Signal types travel as small integer codes and
+# their texts are sent once per connection, in the snapshot.
+#
+#   [SIGNAL,   v, id, student, type_code, time_ms]
+#   [ACK,      v, id]
+#   [JOIN,     v, student]
+#   [LEAVE,    v, student]
+#   [SNAPSHOT, v, [[type, text, priority], ...], [student, ...], [[id, student, type_code, time_ms], ...]]
+#
+# v is the classroom version the change produced (see state.py). Every stream
+# payload is a list of events, so a coalesced burst needs no special case.
+
+SIGNAL, ACK, JOIN, LEAVE, SNAPSHOT = range(1, 6)
+
+# Delivery priorities, most urgent first. Signals are stored, streamed and
+# shown in this order; URGENT and HIGH skip the coalescing window and jump
+# ahead of NORMAL events queued for a slow teacher.
+URGENT, HIGH, NORMAL = range(3)
+
+
+class EventSchema:
+    def __init__(self, signal_types, priorities=None):
+        priorities = priorities or {}
+        # code -> (type, text, priority)
+        self.types = [
+            (signal_type, text, priorities.get(signal_type, NORMAL)) for signal_type, text in signal_types.items()
+        ]
+        self.codes = {signal_type: code for code, (signal_type, _, _) in enumerate(self.types)}
+
+    def _signal(self, record):
+        return [record["id"], record["student"], self.codes[record["type"]], int(record["time"] * 1000)]
+
+    def delta(self, delta):
+        # A state delta ({"op": ..., "v": ...}) as a compact event
+        op, v = delta["op"], delta["v"]
+        if op == "signal":
+            return [SIGNAL, v, *self._signal(delta["signal"])]
+        if op == "ack":
+            return [ACK, v, delta["id"]]
+        if op == "join":
+            return [JOIN, v, delta["student"]]
+        if op == "leave":
+            return [LEAVE, v, delta["student"]]
+        raise ValueError(f"Unknown change {op!r}")
+
+    def snapshot(self, snapshot):
+        return [
+            SNAPSHOT, snapshot["v"], [list(entry) for entry in self.types],
+            snapshot["students"], [self._signal(record) for record in snapshot["signals"]],
+        ]
+
+
+# Wire encodings, picked per subscriber from its Accept header. The hub
+# encodes each payload once per encoding in use, not once per subscriber.
+# A frame with seq None carries no event id (see the hub's priority lanes).
+
+class SSEEncoding:
+    content_type = b"text/event-stream"
+    hello = b"data: connected\n\n"
+    keepalive = b": keepalive\n\n" # SSE comment, ignored by clients
+    resync = b"data: resync\n\n" # tells the client to refetch /signals (hubs without a snapshot source)
+
+    @staticmethod
+    def frame(seq, payload):
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        if seq is None:
+            return b"data: %s\n\n" % data
+        return b"id: %d\ndata: %s\n\n" % (seq, data)
+
+
+class MsgpackEncoding:
+    # A plain stream of msgpack objects: [seq, payload] per event, nil as keepalive.
+    # Clients feed the socket into msgpack.Unpacker and send the last non-nil
+    # seq back as Last-Event-ID.
+    content_type = b"application/x-msgpack"
+    hello = b""
+    keepalive = b"\xc0"
+    resync = b"\x92\xc0\xa6resync" # [nil, "resync"]
+
+    @staticmethod
+    def frame(seq, payload):
+        return msgpack.packb([seq, payload])
+
+
+class WebSocketEncoding:
+    # Text messages on a classroom socket (see the hub): [seq, payload] per
+    # event, with seq null when there is none. Replies to the client's own
+    # requests are JSON objects instead, so the two never look alike.
+    # Not negotiated by Accept: the hub uses it for /ws connections.
+    content_type = None
+    hello = b""
+    keepalive = encode_frame(OP_PING)
+    resync = encode_frame(OP_TEXT, b'[null,"resync"]')
+
+    @staticmethod
+    def frame(seq, payload):
+        return encode_frame(OP_TEXT, json.dumps([seq, payload], separators=(",", ":")).encode())
+
+
+ENCODINGS = {"json": SSEEncoding, "msgpack": MsgpackEncoding}
+
+
+def negotiate(accept):
+    # Encoding for an Accept header, or None if the client asked for msgpack
+    # and it isn't installed here
+    if "application/x-msgpack" in (accept or ""):
+        return "msgpack" if msgpack is not None else None
+    return "json"
@@ -0,0 +1,74 @@
+import bisect
+import threading
+
+# Minimal Prometheus text-format metrics.
+# Observations take one short uncontended lock per series, and rendering
+# happens only when /metrics is scraped, so the hot path stays cheap.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + body + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {} # label values -> [bucket counts..., over the last bound, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+            series[index] += 1 # counts per bucket (index len(buckets): above them all); made cumulative when rendered
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(labels + [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {series[-1]}")
+        return lines
+
+
+def render_values(name, help_text, kind, values):
+    # values: {tuple of (label, value) pairs: number} for a counter or gauge
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in sorted(values.items()):
+        lines.append(f"{name}{_labels(labels)} {value}")
+    return lines
+
+
+if __name__ == "__main__":
+    # Quick self-check: python metrics.py
+    histogram = Histogram("check", "self-check", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 3.0):
+        histogram.observe(value)
+    rendered = histogram.render()
+    assert "check_sum 3.55" in rendered, rendered # 3.0 is over the last bound: counted in +Inf only
+    assert 'check_bucket{le="1.0"} 2' in rendered and 'check_bucket{le="+Inf"} 3' in rendered, rendered
+    assert "check_count 3" in rendered, rendered
+    print("OK")
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Per-student limits on sending signals, so one student mashing a button
+# can't flood every teacher screen.
+#
+# Token bucket per (classroom, student): `burst` signals at once, then `rate`
+# more per second. Duplicate suppression: the same student sending the same
+# signal type again within `duplicate_window` seconds is dropped (0 = off).
+#
+# Both tables are OrderedDicts kept in last-used order. Every check first
+# drops entries from the front that have been idle long enough to behave
+# exactly like a missing one (a full bucket, an expired window), so memory
+# follows the students who are actually sending and each call is O(1)
+# amortized. Limits are per process: with several workers each counts alone.
+
+
+class SignalLimiter:
+    def __init__(self, rate, burst, duplicate_window=0):
+        self.rate = rate # tokens per second
+        self.burst = burst # bucket size
+        self.duplicate_window = duplicate_window
+        self._buckets = OrderedDict() # (class_id, student) -> (tokens, last refill)
+        self._recent = OrderedDict() # (class_id, student, signal_type) -> last accepted
+        self._lock = threading.Lock()
+        self.stats = {"rate_limited": 0, "suppressed": 0}
+
+    def check(self, class_id, student, signal_type):
+        # None if the signal may be sent, else ("rate_limited" | "suppressed", seconds until it could be)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+
+            recent_key = (class_id, student, signal_type)
+            if self.duplicate_window > 0:
+                last = self._recent.get(recent_key)
+                if last is not None and now - last < self.duplicate_window:
+                    self.stats["suppressed"] += 1
+                    return "suppressed", self.duplicate_window - (now - last)
+
+            bucket_key = (class_id, student)
+            tokens, last = self._buckets.pop(bucket_key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[bucket_key] = (tokens, now)
+                self.stats["rate_limited"] += 1
+                return "rate_limited", (1 - tokens) / self.rate
+            self._buckets[bucket_key] = (tokens - 1, now)
+
+            if self.duplicate_window > 0:
+                self._recent.pop(recent_key, None) # re-insert at the back
+                self._recent[recent_key] = now
+            return None
+
+    def _expire(self, now):
+        refill = self.burst / self.rate # an idle bucket is full again after this long
+        while self._buckets and now - next(iter(self._buckets.values()))[1] >= refill:
+            self._buckets.popitem(last=False)
+        while self._recent and now - next(iter(self._recent.values())) >= self.duplicate_window:
+            self._recent.popitem(last=False)
+
+    def __len__(self):
+        # Tracked entries, for /metrics
+        return len(self._buckets) + len(self._recent)
@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+
+# Serialized GET bodies per classroom, reused until the classroom changes.
+#
+# Teachers and dashboards poll the same roster and signal lists over and over
+# between changes, so each distinct response (a full list, one page, the
+# changes since some version) is JSON-encoded once per classroom version and
+# served as bytes after that. Entries are filed under the version they were
+# built at: the first lookup with a newer version drops the classroom's old
+# entries, so nothing has to be told about writes. Bounded by classrooms
+# (least recently used go first) and by entries per classroom.
+# Like the limiter, the cache is per process when running several workers.
+
+
+class ResponseCache:
+    def __init__(self, max_classrooms=1000, max_entries=64):
+        self.max_classrooms = max_classrooms
+        self.max_entries = max_entries # distinct pages / since-versions kept per classroom
+        self._classrooms = OrderedDict() # class_id -> (version, OrderedDict of key -> bytes)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, class_id, version, key, make_body):
+        # The body for `key` at `version`, calling make_body() (-> bytes) only on a miss.
+        # make_body runs outside the lock: two requests racing on a miss both build it.
+        with self._lock:
+            entry = self._classrooms.get(class_id)
+            if entry is not None and entry[0] == version and key in entry[1]:
+                self._classrooms.move_to_end(class_id)
+                entry[1].move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1][key]
+            self.stats["misses"] += 1
+
+        body = make_body()
+        with self._lock:
+            entry = self._classrooms.get(class_id)
+            if entry is None or entry[0] != version:
+                entry = self._classrooms[class_id] = (version, OrderedDict())
+            self._classrooms.move_to_end(class_id)
+            entry[1][key] = body
+            if len(entry[1]) > self.max_entries:
+                entry[1].popitem(last=False)
+            if len(self._classrooms) > self.max_classrooms:
+                self._classrooms.popitem(last=False)
+        return body
+
+    def forget(self, class_id):
+        # Drop a classroom's entries (it was archived)
+        with self._lock:
+            self._classrooms.pop(class_id, None)
+
+    def __len__(self):
+        # Bodies held, for /metrics
+        with self._lock:
+            return sum(len(entries) for _, entries in self._classrooms.values())
@@ -0,0 +1,50 @@
+import bisect
+import itertools
+
+# Students in one classroom. A dict doubles as an ordered set: membership,
+# join and leave are hash operations and iteration follows join order.
+# Each join gets an increasing join number, which is what paged reads use as
+# their cursor: unlike a position it stays put when earlier students leave.
+# Not thread-safe by itself: MemoryState holds the classroom lock around it.
+
+
+class Roster:
+    def __init__(self):
+        self._students = {} # name -> join number
+        self._joins = itertools.count(1)
+        self._order = None # ([join numbers], [names]) for paging, rebuilt after a change
+
+    def add(self, name):
+        # False if the student was already in class
+        if name in self._students:
+            return False
+        self._students[name] = next(self._joins)
+        self._order = None
+        return True
+
+    def remove(self, name):
+        # False if the student was not in class
+        if self._students.pop(name, None) is None:
+            return False
+        self._order = None
+        return True
+
+    def names(self):
+        return list(self._students)
+
+    def page(self, after=None, limit=None):
+        # Up to `limit` names that joined after join number `after` (None: from
+        # the start), in join order, and the cursor for the next page (None on the last one)
+        if self._order is None:
+            # Dict order is join order, so both lists are already sorted
+            self._order = (list(self._students.values()), list(self._students))
+        joins, names = self._order
+        start = 0 if after is None else bisect.bisect_right(joins, after)
+        end = len(names) if limit is None else min(start + limit, len(names))
+        return names[start:end], (joins[end - 1] if end < len(names) else None)
+
+    def __len__(self):
+        return len(self._students)
+
+    def __contains__(self, name):
+        return name in self._students
@@ -0,0 +1,85 @@
+import bisect
+import heapq
+import itertools
+import time
+
+from events import NORMAL
+
+# Pending signals for one classroom, keyed by a server-assigned ID, so
+# acknowledging one is a single hash lookup. Alongside the dict a heap of
+# (priority, id) keeps them in delivery order: most urgent first, oldest first
+# within a priority. Acknowledged entries are left in the heap and skipped,
+# and the heap is rebuilt once they outnumber the live ones. Reads sort the
+# live keys once and reuse that until the next add or acknowledge.
+# Not thread-safe by itself: MemoryState holds the classroom lock around it.
+
+_next_id = itertools.count(1) # shared across classrooms so IDs are globally unique
+
+
+def reserve_ids(last_id):
+    # After recovery from disk, make sure new IDs continue past the restored ones
+    global _next_id
+    _next_id = itertools.count(last_id + 1)
+
+
+class SignalStore:
+    def __init__(self):
+        self._signals = {} # id -> signal record
+        self._order = [] # heap of (priority, id), may hold acknowledged ids
+        self._sorted = None # live (priority, id) in delivery order, None after a change
+
+    def add(self, student, signal_type, text, priority=NORMAL):
+        record = {
+            "id": next(_next_id),
+            "student": student,
+            "type": signal_type,
+            "text": text,
+            "time": time.time(),
+            "priority": priority,
+        }
+        self._signals[record["id"]] = record
+        heapq.heappush(self._order, (priority, record["id"]))
+        self._sorted = None
+        return record
+
+    def restore(self, record):
+        # Re-insert a record recovered from disk, keeping its original ID
+        record.setdefault("priority", NORMAL) # logged before priorities existed
+        self._signals[record["id"]] = record
+        heapq.heappush(self._order, (record["priority"], record["id"]))
+        self._sorted = None
+
+    def acknowledge(self, signal_id):
+        # Returns the removed record, or None if it was already acknowledged
+        record = self._signals.pop(signal_id, None)
+        if record is None:
+            return None
+        self._sorted = None
+        if len(self._order) > 2 * len(self._signals) + 64:
+            self._order = [(signal["priority"], signal["id"]) for signal in self._signals.values()]
+            heapq.heapify(self._order)
+        return record
+
+    def _keys(self):
+        if self._sorted is None:
+            # Sorting a heap is close to linear
+            self._sorted = [key for key in sorted(self._order) if key[1] in self._signals]
+        return self._sorted
+
+    def pending(self):
+        # In delivery order
+        return [self._signals[signal_id] for _, signal_id in self._keys()]
+
+    def page(self, after=None, limit=None):
+        # Up to `limit` signals in delivery order after the (priority, id) key
+        # `after`, and the key to continue from (None on the last page)
+        keys = self._keys()
+        start = 0 if after is None else bisect.bisect_right(keys, after)
+        end = len(keys) if limit is None else min(start + limit, len(keys))
+        return [self._signals[signal_id] for _, signal_id in keys[start:end]], (keys[end - 1] if end < len(keys) else None)
+
+    def __len__(self):
+        return len(self._signals)
+
+    def __contains__(self, signal_id):
+        return signal_id in self._signals
@@ -0,0 +1,622 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from events import NORMAL
+from signal_store import SignalStore, reserve_ids
+from roster import Roster
+
+# Classroom state behind the route handlers.
+#
+# MemoryState is the single-process store (dicts of Roster / SignalStore,
+# optionally backed by the event log). SqliteState keeps the same data in a
+# local SQLite file so several worker processes can share it. Both expose
+# the same methods; handlers check exists() first and then call the rest.
+#
+# Every change bumps the classroom's version and is handed to on_change as a
+# delta tagged with that version ({"op": "signal" | "ack" | "join" | "leave",
+# "v": n, ...}), which is what the teacher streams are built from. The last
+# CHANGE_LOG_SIZE deltas per classroom are also kept, so a client holding an
+# older version can ask for just what changed since (changes()).
+#
+# Versions given to clients are opaque strings (see version()); the paged and
+# incremental reads return the version they were read at alongside the data.
+
+IDEMPOTENCY_TTL = 600 # seconds a client retry key is remembered per classroom
+SIGNAL_COLUMNS = ("id", "student", "type", "text", "time", "priority") # SqliteState rows -> records
+CHANGE_LOG_SIZE = 500 # recent deltas kept per classroom for changes(); older versions refetch in full
+
+
+class MemoryState:
+    # Each classroom carries its own lock, so requests for different classrooms
+    # never contend. Creating a classroom uses dict.setdefault, which is atomic,
+    # instead of a lock around the whole dict.
+    #
+    # With an archive, classrooms nobody has touched for a while are written to
+    # disk and dropped from memory by evict_idle(); the next access loads them
+    # back transparently, so only the classrooms in use stay in memory.
+
+    def __init__(self, event_log=None, archive=None):
+        self.classrooms = {}
+        self.event_log = event_log
+        self.archive = archive # ClassroomArchive, or None to keep every classroom in memory
+        self.on_change = None # callable(class_id, delta), set by the server
+        # Versions restart with the process, so tag them with a per-boot epoch
+        self.epoch = os.urandom(4).hex()
+        self.stats = {"evicted": 0, "rehydrated": 0}
+        self._archive_lock = threading.Lock() # eviction and rehydration of any classroom, one at a time
+
+    @staticmethod
+    def _new_classroom(name, coalesce_ms, version=1):
+        return {
+            "name": name, #for UI
+            "coalesce_ms": coalesce_ms, #stream batching window
+            "students": Roster(), #connected students
+            "signals" : SignalStore(), #pending signals by id
+            "idempotency": OrderedDict(), #retry key -> (time, record), oldest first
+            "version": version, #bumped on every change, for ETags
+            "changes": deque(maxlen=CHANGE_LOG_SIZE), #latest deltas, one per version
+            "last_active": time.monotonic(), #for idle eviction
+            "evicted": False, #set under the lock once archived
+            "lock": threading.Lock(),
+        }
+
+    def _get(self, class_id):
+        # The in-memory classroom (loaded back from the archive if needed), or None
+        classroom = self.classrooms.get(class_id)
+        if classroom is None:
+            classroom = self._rehydrate(class_id)
+        return classroom
+
+    @contextmanager
+    def _locked(self, class_id):
+        while True:
+            classroom = self._get(class_id)
+            if classroom is None:
+                raise KeyError(class_id)
+            with classroom["lock"]:
+                # Lost a race with the reaper: fetch it again (from the archive)
+                if not classroom["evicted"]:
+                    # Only real reads and writes count as activity, not exists() checks
+                    classroom["last_active"] = time.monotonic()
+                    yield classroom
+                    return
+
+    def _persist(self, event):
+        # Append a mutation to the durable log (no-op when persistence is off)
+        if self.event_log is not None:
+            self.event_log.append(event)
+
+    def _changed(self, classroom, event):
+        # Called with the classroom lock held, so the log and the stream both
+        # see one classroom's changes in version order
+        classroom["version"] += 1
+        self._persist(event)
+        delta = dict(event, v=classroom["version"])
+        classroom["changes"].append(delta)
+        if self.on_change is not None:
+            self.on_change(event["class"], delta)
+
+    def recover(self):
+        # Rebuild classrooms from the snapshot + log on disk, then start logging.
+        # Archived classrooms are not in the log (it records their eviction) and stay on disk,
+        # but their signals keep their IDs, so new IDs start past those too.
+        saved_state = self.event_log.recover()
+        last_id = 0
+        for class_id, saved in saved_state.items():
+            classroom = self.classrooms[class_id] = self._new_classroom(saved["name"], saved.get("coalesce_ms", 0))
+            for record in saved["signals"].values():
+                classroom["signals"].restore(record)
+                last_id = max(last_id, record["id"])
+            for name in saved["students"]:
+                classroom["students"].add(name)
+        if self.archive is not None:
+            last_id = max(last_id, self.archive.last_signal_id)
+        reserve_ids(last_id)
+        self.event_log.start()
+        return len(saved_state)
+
+    # --- eviction ---
+
+    def evict_idle(self, ttl, max_hot, in_use=lambda class_id: False):
+        # Archive classrooms idle for ttl seconds, then the least recently used
+        # beyond max_hot. Classrooms in_use(class_id) are kept. Returns the evicted ids.
+        if self.archive is None:
+            return []
+        now = time.monotonic()
+        by_age = sorted(self.classrooms.items(), key=lambda item: item[1]["last_active"])
+        excess = len(by_age) - max_hot
+        evicted = []
+        for class_id, classroom in by_age:
+            if now - classroom["last_active"] < ttl and len(evicted) >= excess:
+                break
+            if not in_use(class_id) and self._evict(class_id, classroom):
+                evicted.append(class_id)
+        return evicted
+
+    def _evict(self, class_id, classroom):
+        with classroom["lock"], self._archive_lock:
+            if classroom["evicted"]:
+                return False
+            self.archive.save(class_id, {
+                "name": classroom["name"],
+                "coalesce_ms": classroom["coalesce_ms"],
+                "version": classroom["version"],
+                "students": classroom["students"].names(),
+                "signals": classroom["signals"].pending(),
+            })
+            classroom["evicted"] = True
+            del self.classrooms[class_id]
+            self._persist({"op": "evict", "class": class_id})
+            self.stats["evicted"] += 1
+            return True
+
+    def _rehydrate(self, class_id):
+        # Unknown ids (404 probes) are turned away here, without the lock or a disk read
+        if self.archive is None or class_id not in self.archive:
+            return None
+        with self._archive_lock:
+            classroom = self.classrooms.get(class_id)
+            if classroom is not None:
+                return classroom # someone else loaded it first
+            saved = self.archive.load(class_id)
+            if saved is None:
+                return None
+            classroom = self._new_classroom(saved["name"], saved["coalesce_ms"], saved["version"])
+            for record in saved["signals"]:
+                classroom["signals"].restore(record)
+            for name in saved["students"]:
+                classroom["students"].add(name)
+            # Logged before anyone can see it, so its later changes replay on top
+            self._persist({
+                "op": "restore", "class": class_id, "name": saved["name"], "coalesce_ms": saved["coalesce_ms"],
+                "students": saved["students"], "signals": saved["signals"],
+            })
+            self.classrooms[class_id] = classroom
+            self.stats["rehydrated"] += 1
+            return classroom
+
+    # --- reads ---
+
+    def exists(self, class_id):
+        return self._get(class_id) is not None
+
+    def classroom(self, class_id):
+        # Classroom as sent to clients (signal store flattened to a list, oldest first)
+        with self._locked(class_id) as classroom:
+            return {
+                "name": classroom["name"],
+                "coalesce_ms": classroom["coalesce_ms"],
+                "students": classroom["students"].names(),
+                "signals": classroom["signals"].pending(),
+            }
+
+    def coalesce_window(self, class_id):
+        # Seconds to batch stream events for (0 = send each one immediately)
+        return self._get(class_id)["coalesce_ms"] / 1000
+
+    def version(self, class_id):
+        # Opaque token that changes whenever the classroom's roster or signals do
+        classroom = self._get(class_id)
+        classroom["last_active"] = time.monotonic() # a 304 revalidation is activity too
+        return self._tag(classroom)
+
+    def _tag(self, classroom):
+        return f"{self.epoch}-{classroom['version']}"
+
+    def totals(self):
+        # (classrooms, students, pending signals) in memory, for /metrics
+        classrooms = list(self.classrooms.values())
+        students = sum(len(classroom["students"]) for classroom in classrooms)
+        signals = sum(len(classroom["signals"]) for classroom in classrooms)
+        return len(classrooms), students, signals
+
+    def snapshot(self, class_id):
+        # Roster and pending signals as of one version, read under the lock so
+        # no change can land between the parts
+        with self._locked(class_id) as classroom:
+            return {
+                "v": classroom["version"],
+                "students": classroom["students"].names(),
+                "signals": classroom["signals"].pending(),
+            }
+
+    def find_key(self, class_id, key):
+        # The record a retry key created in the last IDEMPOTENCY_TTL seconds, or None
+        with self._locked(class_id) as classroom:
+            entry = classroom["idempotency"].get(key)
+            if entry is None or entry[0] < time.time() - IDEMPOTENCY_TTL:
+                return None
+            return entry[1]
+
+    def students(self, class_id):
+        with self._locked(class_id) as classroom:
+            return classroom["students"].names()
+
+    def signals(self, class_id):
+        with self._locked(class_id) as classroom:
+            return classroom["signals"].pending()
+
+    def students_page(self, class_id, after=None, limit=None):
+        # (version, names, next cursor): students who joined after join number `after`
+        with self._locked(class_id) as classroom:
+            return (self._tag(classroom), *classroom["students"].page(after, limit))
+
+    def signals_page(self, class_id, after=None, limit=None):
+        # (version, records, next cursor): signals after the (priority, id) key `after`
+        with self._locked(class_id) as classroom:
+            return (self._tag(classroom), *classroom["signals"].page(after, limit))
+
+    def changes(self, class_id, since):
+        # (version, deltas after version `since`), or (version, None) when
+        # `since` is from another boot or older than the kept log
+        with self._locked(class_id) as classroom:
+            epoch, _, number = since.rpartition("-")
+            log = classroom["changes"]
+            behind = classroom["version"] - int(number) if epoch == self.epoch and number.isdigit() else -1
+            if not 0 <= behind <= len(log):
+                return self._tag(classroom), None
+            return self._tag(classroom), list(log)[len(log) - behind:]
+
+    # --- writes ---
+    # Mutations are logged while the classroom lock is held, so the event log
+    # sees each classroom's changes in the same order they were applied.
+
+    def create(self, class_id, name, coalesce_ms=0):
+        # False if the classroom already exists (in memory or archived)
+        if self._get(class_id) is not None:
+            return False
+        classroom = self._new_classroom(name, coalesce_ms)
+        with classroom["lock"]: # nobody else can log for it until its create is queued
+            if self.classrooms.setdefault(class_id, classroom) is not classroom:
+                return False
+            self._persist({"op": "create", "class": class_id, "name": name, "coalesce_ms": coalesce_ms})
+        return True
+
+    def join(self, class_id, name):
+        # New head count, or None if the student was already in class
+        with self._locked(class_id) as classroom:
+            students = classroom["students"]
+            if not students.add(name):
+                return None
+            self._changed(classroom, {"op": "join", "class": class_id, "student": name})
+            return len(students)
+
+    def sync_roster(self, class_id, to_join, to_leave):
+        with self._locked(class_id) as classroom:
+            students = classroom["students"]
+            joined = [name for name in to_join if name and students.add(name)]
+            left = [name for name in to_leave if students.remove(name)]
+            for name in joined:
+                self._changed(classroom, {"op": "join", "class": class_id, "student": name})
+            for name in left:
+                self._changed(classroom, {"op": "leave", "class": class_id, "student": name})
+            return joined, left, len(students)
+
+    def leave(self, class_id, name):
+        with self._locked(class_id) as classroom:
+            if not classroom["students"].remove(name):
+                return False
+            self._changed(classroom, {"op": "leave", "class": class_id, "student": name})
+            return True
+
+    def add_signal(self, class_id, student, signal_type, text, key=None, priority=NORMAL):
+        # (record, created). A retry with a key seen in the last IDEMPOTENCY_TTL
+        # seconds returns the original record with created=False.
+        with self._locked(class_id) as classroom:
+            seen = classroom["idempotency"]
+            now = time.time()
+            while seen and next(iter(seen.values()))[0] < now - IDEMPOTENCY_TTL:
+                seen.popitem(last=False)
+            if key is not None and key in seen:
+                return seen[key][1], False
+
+            record = classroom["signals"].add(student, signal_type, text, priority)
+            if key is not None:
+                seen[key] = (now, record)
+            self._changed(classroom, {"op": "signal", "class": class_id, "signal": record})
+            return record, True
+
+    def acknowledge(self, class_id, signal_id):
+        with self._locked(class_id) as classroom:
+            record = classroom["signals"].acknowledge(signal_id)
+            if record is not None:
+                self._changed(classroom, {"op": "ack", "class": class_id, "id": signal_id})
+            return record
+
+
+class SqliteState:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS classrooms (
+            id   TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            seq  INTEGER NOT NULL DEFAULT 0, -- stream event sequence shared by all workers
+            coalesce_ms INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 1 -- bumped on every change, for ETags
+        );
+        CREATE TABLE IF NOT EXISTS students (
+            class_id TEXT NOT NULL,
+            name     TEXT NOT NULL,
+            joined   REAL NOT NULL,
+            PRIMARY KEY (class_id, name)
+        );
+        CREATE INDEX IF NOT EXISTS students_by_join ON students (class_id); -- rowid order within a class
+        CREATE TABLE IF NOT EXISTS signals (
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id TEXT NOT NULL,
+            student  TEXT,
+            type     TEXT NOT NULL,
+            text     TEXT NOT NULL,
+            time     REAL NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 2 -- events.NORMAL
+        );
+        CREATE INDEX IF NOT EXISTS signals_by_priority ON signals (class_id, priority, id);
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            class_id TEXT NOT NULL,
+            key      TEXT NOT NULL,
+            created  REAL NOT NULL,
+            record   TEXT NOT NULL, -- JSON of the signal first created with this key
+            PRIMARY KEY (class_id, key)
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            class_id TEXT NOT NULL,
+            v        INTEGER NOT NULL,
+            delta    TEXT NOT NULL, -- JSON, as handed to on_change
+            PRIMARY KEY (class_id, v)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local() # one connection per thread (and per process)
+        self.on_change = None # callable(class_id, delta), set by the server
+        self._db().executescript(self.SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        # SQLite connections must not be shared across fork(), so reopen in worker processes
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")   # readers never block the writer
+            db.execute("PRAGMA synchronous=NORMAL") # fsync at checkpoints, not every commit
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    # --- reads ---
+
+    def exists(self, class_id):
+        return self._db().execute("SELECT 1 FROM classrooms WHERE id = ?", (class_id,)).fetchone() is not None
+
+    def classroom(self, class_id):
+        name, coalesce_ms = self._db().execute(
+            "SELECT name, coalesce_ms FROM classrooms WHERE id = ?", (class_id,)
+        ).fetchone()
+        return {
+            "name": name,
+            "coalesce_ms": coalesce_ms,
+            "students": self.students(class_id),
+            "signals": self.signals(class_id),
+        }
+
+    def coalesce_window(self, class_id):
+        (coalesce_ms,) = self._db().execute("SELECT coalesce_ms FROM classrooms WHERE id = ?", (class_id,)).fetchone()
+        return coalesce_ms / 1000
+
+    def totals(self):
+        db = self._db()
+        return tuple(
+            db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("classrooms", "students", "signals")
+        )
+
+    def find_key(self, class_id, key):
+        row = self._db().execute(
+            "SELECT record FROM idempotency_keys WHERE class_id = ? AND key = ? AND created >= ?",
+            (class_id, key, time.time() - IDEMPOTENCY_TTL),
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def students(self, class_id):
+        rows = self._db().execute("SELECT name FROM students WHERE class_id = ? ORDER BY rowid", (class_id,))
+        return [name for (name,) in rows]
+
+    def signals(self, class_id):
+        # Most urgent first, oldest first within a priority
+        rows = self._db().execute(
+            "SELECT id, student, type, text, time, priority FROM signals WHERE class_id = ? ORDER BY priority, id",
+            (class_id,),
+        )
+        return [dict(zip(SIGNAL_COLUMNS, row)) for row in rows]
+
+    def version(self, class_id):
+        (version,) = self._db().execute("SELECT version FROM classrooms WHERE id = ?", (class_id,)).fetchone()
+        return str(version)
+
+    # Paged and incremental reads run in one read transaction with their version
+
+    def students_page(self, class_id, after=None, limit=None):
+        db = self._db()
+        with db:
+            db.execute("BEGIN")
+            rows = db.execute(
+                "SELECT rowid, name FROM students WHERE class_id = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (class_id, after or 0, -1 if limit is None else limit + 1), # one extra row says whether there's more
+            ).fetchall()
+            more = limit is not None and len(rows) > limit
+            rows = rows[:limit] if more else rows
+            return self.version(class_id), [name for _, name in rows], (rows[-1][0] if more else None)
+
+    def signals_page(self, class_id, after=None, limit=None):
+        priority, signal_id = after if after is not None else (-1, 0)
+        db = self._db()
+        with db:
+            db.execute("BEGIN")
+            rows = db.execute(
+                "SELECT id, student, type, text, time, priority FROM signals"
+                " WHERE class_id = ? AND (priority, id) > (?, ?) ORDER BY priority, id LIMIT ?",
+                (class_id, priority, signal_id, -1 if limit is None else limit + 1),
+            ).fetchall()
+            more = limit is not None and len(rows) > limit
+            records = [dict(zip(SIGNAL_COLUMNS, row)) for row in (rows[:limit] if more else rows)]
+            return self.version(class_id), records, ((records[-1]["priority"], records[-1]["id"]) if more else None)
+
+    def changes(self, class_id, since):
+        db = self._db()
+        with db:
+            db.execute("BEGIN")
+            version = self.version(class_id)
+            if not since.isdigit() or int(since) > int(version):
+                return version, None
+            rows = db.execute(
+                "SELECT delta FROM changes WHERE class_id = ? AND v > ? ORDER BY v", (class_id, int(since))
+            ).fetchall()
+            # Complete only if every version since is still there (one delta per version)
+            if len(rows) != int(version) - int(since):
+                return version, None
+            return version, [json.loads(delta) for (delta,) in rows]
+
+    def snapshot(self, class_id):
+        # One read transaction, so roster, signals and version agree
+        db = self._db()
+        with db:
+            db.execute("BEGIN")
+            return {
+                "v": int(self.version(class_id)),
+                "students": self.students(class_id),
+                "signals": self.signals(class_id),
+            }
+
+    def _bump(self, db, class_id, event, changes):
+        # Inside the write transaction: take the next version for this change
+        [(version,)] = db.execute(
+            "UPDATE classrooms SET version = version + 1 WHERE id = ? RETURNING version", (class_id,)
+        ).fetchall()
+        delta = dict(event, v=version)
+        db.execute("INSERT INTO changes (class_id, v, delta) VALUES (?, ?, ?)", (class_id, version, json.dumps(delta)))
+        db.execute("DELETE FROM changes WHERE class_id = ? AND v <= ?", (class_id, version - CHANGE_LOG_SIZE))
+        changes.append(delta)
+
+    def _changed(self, class_id, changes):
+        # After commit. Workers commit in version order but may publish slightly
+        # out of it; stream clients apply deltas by version, not arrival.
+        if self.on_change is not None:
+            for delta in changes:
+                self.on_change(class_id, delta)
+
+    def next_seq(self, class_id):
+        # fetchall() so the RETURNING statement completes and releases its write lock
+        [(seq,)] = self._db().execute(
+            "UPDATE classrooms SET seq = seq + 1 WHERE id = ? RETURNING seq", (class_id,)
+        ).fetchall()
+        return seq
+
+    # --- writes ---
+
+    def create(self, class_id, name, coalesce_ms=0):
+        cursor = self._db().execute(
+            "INSERT OR IGNORE INTO classrooms (id, name, coalesce_ms) VALUES (?, ?, ?)", (class_id, name, coalesce_ms)
+        )
+        return cursor.rowcount == 1
+
+    def _count(self, db, class_id):
+        return db.execute("SELECT COUNT(*) FROM students WHERE class_id = ?", (class_id,)).fetchone()[0]
+
+    # Every write runs in one transaction together with its version bump
+
+    def join(self, class_id, name):
+        db = self._db()
+        changes = []
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO students (class_id, name, joined) VALUES (?, ?, ?)", (class_id, name, time.time())
+            )
+            if cursor.rowcount == 0:
+                return None
+            self._bump(db, class_id, {"op": "join", "class": class_id, "student": name}, changes)
+            count = self._count(db, class_id)
+        self._changed(class_id, changes)
+        return count
+
+    def sync_roster(self, class_id, to_join, to_leave):
+        db = self._db()
+        joined, left = [], []
+        changes = []
+        now = time.time()
+        with db: # one transaction for the whole roster
+            db.execute("BEGIN IMMEDIATE")
+            for name in to_join:
+                if name and db.execute(
+                    "INSERT OR IGNORE INTO students (class_id, name, joined) VALUES (?, ?, ?)", (class_id, name, now)
+                ).rowcount:
+                    joined.append(name)
+                    self._bump(db, class_id, {"op": "join", "class": class_id, "student": name}, changes)
+            for name in to_leave:
+                if db.execute("DELETE FROM students WHERE class_id = ? AND name = ?", (class_id, name)).rowcount:
+                    left.append(name)
+                    self._bump(db, class_id, {"op": "leave", "class": class_id, "student": name}, changes)
+        self._changed(class_id, changes)
+        return joined, left, self._count(db, class_id)
+
+    def leave(self, class_id, name):
+        db = self._db()
+        changes = []
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            if not db.execute("DELETE FROM students WHERE class_id = ? AND name = ?", (class_id, name)).rowcount:
+                return False
+            self._bump(db, class_id, {"op": "leave", "class": class_id, "student": name}, changes)
+        self._changed(class_id, changes)
+        return True
+
+    def add_signal(self, class_id, student, signal_type, text, key=None, priority=NORMAL):
+        db = self._db()
+        changes = []
+        now = time.time()
+        with db:
+            db.execute("BEGIN IMMEDIATE") # check-and-insert of the key must not interleave across workers
+            if key is not None:
+                db.execute(
+                    "DELETE FROM idempotency_keys WHERE class_id = ? AND created < ?", (class_id, now - IDEMPOTENCY_TTL)
+                )
+                row = db.execute(
+                    "SELECT record FROM idempotency_keys WHERE class_id = ? AND key = ?", (class_id, key)
+                ).fetchone()
+                if row is not None:
+                    return json.loads(row[0]), False
+
+            cursor = db.execute(
+                "INSERT INTO signals (class_id, student, type, text, time, priority) VALUES (?, ?, ?, ?, ?, ?)",
+                (class_id, student, signal_type, text, now, priority),
+            )
+            record = {
+                "id": cursor.lastrowid, "student": student, "type": signal_type, "text": text, "time": now,
+                "priority": priority,
+            }
+            self._bump(db, class_id, {"op": "signal", "class": class_id, "signal": record}, changes)
+            if key is not None:
+                db.execute(
+                    "INSERT INTO idempotency_keys (class_id, key, created, record) VALUES (?, ?, ?, ?)",
+                    (class_id, key, now, json.dumps(record)),
+                )
+        self._changed(class_id, changes)
+        return record, True
+
+    def acknowledge(self, class_id, signal_id):
+        db = self._db()
+        changes = []
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                "DELETE FROM signals WHERE id = ? AND class_id = ? RETURNING id, student, type, text, time, priority",
+                (signal_id, class_id),
+            ).fetchall()
+            if not rows:
+                return None
+            self._bump(db, class_id, {"op": "ack", "class": class_id, "id": signal_id}, changes)
+        self._changed(class_id, changes)
+        return dict(zip(SIGNAL_COLUMNS, rows[0]))
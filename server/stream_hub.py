@@ -0,0 +1,553 @@
+import asyncio
+import itertools
+import json
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from events import ENCODINGS, NORMAL, URGENT, WebSocketEncoding, negotiate
+from metrics import Histogram
+from urllib.parse import parse_qs, unquote, urlsplit
+from websocket import (
+    CLOSE_NORMAL, OP_PING, OP_PONG, OP_TEXT, ProtocolError, close_frame, encode_frame, handshake_response, read_message,
+)
+
+# Event-loop based broadcast hub for teacher SSE streams.
+# Every subscriber is a small coroutine + bounded asyncio.Queue instead of a
+# whole OS thread blocked on queue.get(), so one process can hold thousands
+# of open streams. Flask handlers publish into the hub from their own threads.
+# Payloads are lists of events (see events.py); each is encoded once per wire
+# encoding in use (SSE/JSON or msgpack, chosen per subscriber).
+#
+# /classrooms/<id>/ws is the same feed on a WebSocket, which also carries the
+# client's own requests (join, signal, ack, leave) as JSON messages. Those are
+# run by the handle_message callback on a small thread pool, one at a time
+# per socket so they apply in the order sent, and answered with
+# {"ref", "status", "body"}. ?events=0 opens a socket for requests only (a
+# student); ?last_event_id=N resumes like the SSE header does.
+
+SUBSCRIBER_QUEUE_SIZE = 256   # max pending events per teacher connection
+WRITE_BUFFER_HIGH = 64 * 1024 # socket send buffer before we wait on drain()
+REPLAY_SIZE = 512 # recent events kept per classroom for Last-Event-ID resume
+HEARTBEAT_INTERVAL = 15 # seconds between keepalive comments / sweeps
+IDLE_TIMEOUT = 60 # seconds a subscriber may sit with unsent data before it is reaped
+MESSAGE_WORKERS = 16 # threads running WebSocket requests against the classroom state
+MAX_REQUEST_HEAD = 16 * 1024 # bytes of request line + headers before answering 431
+MAX_HEADERS = 64
+
+# What to do when a teacher's queue is full. A slow consumer must never
+# make the server buffer without limit, so every policy keeps memory bounded.
+DROP_OLDEST = "drop_oldest" # discard the oldest queued event of the least urgent lane
+COALESCE = "coalesce"       # replace the backlog with a fresh snapshot (or "resync")
+DISCONNECT = "disconnect"   # evict the subscriber; it can reconnect later
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+
+class LaneQueue:
+    # Bounded subscriber queue with one FIFO lane per priority (see events.py).
+    # get() serves the most urgent non-empty lane, so an emergency never waits
+    # behind a backlog of routine events. A frame that jumps ahead of older,
+    # less urgent ones is handed out in its id-less form: the client's resume
+    # point (Last-Event-ID) must never move past frames it hasn't received yet.
+    # Loop-thread only.
+
+    def __init__(self, maxsize, lanes=NORMAL + 1):
+        self.maxsize = maxsize
+        self._lanes = [deque() for _ in range(lanes)] # of (order, frame, frame without id)
+        self._size = 0
+        self._order = itertools.count()
+        self._ready = asyncio.Event()
+
+    def qsize(self):
+        return self._size
+
+    def empty(self):
+        return self._size == 0
+
+    def full(self):
+        return self._size >= self.maxsize
+
+    def put_nowait(self, frame, lane=URGENT, bare=None):
+        # Control frames (keepalive, snapshot, eviction) go in the URGENT lane,
+        # behind anything already there, so nothing can overtake a snapshot
+        self._lanes[lane].append((next(self._order), frame, frame if bare is None else bare))
+        self._size += 1
+        self._ready.set()
+
+    def drop_oldest(self, lane):
+        # Make room for a frame of `lane` by dropping the oldest frame of the least
+        # urgent lane at or below it; False if only more urgent frames are queued
+        for queued in reversed(self._lanes[lane:]):
+            if queued:
+                queued.popleft()
+                self._size -= 1
+                return True
+        return False
+
+    def clear(self):
+        dropped = self._size
+        for queued in self._lanes:
+            queued.clear()
+        self._size = 0
+        return dropped
+
+    async def get(self):
+        while not self._size:
+            self._ready.clear()
+            await self._ready.wait()
+        for index, queued in enumerate(self._lanes):
+            if queued:
+                order, frame, bare = queued.popleft()
+                self._size -= 1
+                if any(later and later[0][0] < order for later in self._lanes[index + 1:]):
+                    return bare
+                return frame
+
+
+class Subscriber:
+    def __init__(self, class_id, maxsize, writer, encoding):
+        self.class_id = class_id
+        self.encoding = encoding # SSEEncoding / MsgpackEncoding / WebSocketEncoding
+        self.queue = LaneQueue(maxsize)
+        self.writer = writer
+        self.evicted = False
+        self.last_write = asyncio.get_running_loop().time() # last time a drain() completed
+
+    def stalled(self, now, timeout):
+        # Has data waiting (queued or in the socket buffer) that hasn't moved for `timeout`
+        pending = not self.queue.empty() or self.writer.transport.get_write_buffer_size() > 0
+        return pending and now - self.last_write > timeout
+
+    def clear(self):
+        return self.queue.clear()
+
+
+class BroadcastHub:
+    def __init__(self, host, port, classroom_exists, queue_size=SUBSCRIBER_QUEUE_SIZE, overflow=DROP_OLDEST,
+                 replay_size=REPLAY_SIZE, heartbeat_interval=HEARTBEAT_INTERVAL, idle_timeout=IDLE_TIMEOUT,
+                 reuse_port=False, snapshot=None, handle_message=None, message_workers=MESSAGE_WORKERS):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}")
+
+        self.host = host
+        self.port = port
+        self.classroom_exists = classroom_exists # callable(class_id) -> bool
+        # callable(class_id) -> payload with the classroom's current state; a new
+        # subscriber starts from it, then follows the live events
+        self.snapshot = snapshot
+        # callable(class_id, message) -> (status, body) for WebSocket requests;
+        # without it the hub serves no /ws endpoint
+        self.handle_message = handle_message
+        self.executor = ThreadPoolExecutor(max_workers=message_workers, thread_name_prefix="ws")
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.reuse_port = reuse_port
+        self.subscribers = {} # class_id -> set of Subscriber (only touched on the loop thread)
+        # Per-classroom event sequence and ring buffer of (seq, payload), also loop-thread only
+        self.replay_size = replay_size
+        self.last_seq = {}
+        self.history = {}
+        # Overflow counters, only written on the loop thread
+        self.stats = {
+            "dropped": 0, "coalesced": 0, "evicted": 0, "reaped": 0,
+            "connects": 0, "disconnects": 0, "max_queue_depth": 0,
+        }
+        self.fanout_seconds = Histogram(
+            "handraise_stream_fanout_seconds", "Time to queue one event for every subscriber of a classroom"
+        )
+        self.loop = None
+        self._ready = threading.Event()
+
+    # --- lifecycle ---
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="stream-hub", daemon=True)
+        thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(
+            # reuse_port lets every worker process bind the stream port; the kernel spreads connections
+            asyncio.start_server(self._handle_client, self.host, self.port, backlog=1024,
+                                 reuse_port=self.reuse_port or None)
+        )
+        sweeper = self.loop.create_task(self._sweep())
+        print(f"Stream hub listening on {self.host}:{self.port}")
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            sweeper.cancel()
+            server.close()
+            self.loop.run_until_complete(server.wait_closed())
+            self.loop.close()
+
+    # --- publishing (safe to call from any thread) ---
+
+    def publish(self, class_id, payload, seq=None, priority=NORMAL):
+        # seq is normally assigned by the hub; multi-worker brokers pass a shared one
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self._fanout, class_id, payload, seq, priority)
+
+    def _fanout(self, class_id, payload, seq=None, priority=NORMAL):
+        start = time.perf_counter()
+        # Local sequence numbers are assigned here, on the loop thread, so they match delivery order
+        last = self.last_seq.get(class_id, 0)
+        if seq is None:
+            seq = last + 1
+        self.last_seq[class_id] = max(last, seq)
+
+        history = self.history.get(class_id)
+        if history is None:
+            history = self.history[class_id] = deque(maxlen=self.replay_size)
+        if history and seq < history[-1][0]:
+            # Shared seq that arrived out of order from another worker: keep the buffer sorted
+            items = sorted([*history, (seq, payload)], key=lambda item: item[0])
+            history.clear()
+            history.extend(items)
+        else:
+            history.append((seq, payload))
+
+        frames = {} # encoding -> (frame, frame without id), built on first use
+        for sub in self.subscribers.get(class_id, ()):
+            pair = frames.get(sub.encoding)
+            if pair is None:
+                frame = sub.encoding.frame(seq, payload)
+                # Only frames that can overtake others need an id-less form
+                bare = sub.encoding.frame(None, payload) if priority < NORMAL else frame
+                pair = frames[sub.encoding] = (frame, bare)
+            self._offer(sub, pair[0], priority, pair[1])
+        self.fanout_seconds.observe(time.perf_counter() - start)
+
+    def _offer(self, sub, frame, priority, bare):
+        if sub.evicted:
+            return
+        if not sub.queue.full():
+            sub.queue.put_nowait(frame, priority, bare)
+            if sub.queue.qsize() > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = sub.queue.qsize()
+            return
+
+        # Slow consumer: apply the overflow policy instead of growing the queue
+        if self.overflow == DROP_OLDEST:
+            if sub.queue.drop_oldest(priority):
+                sub.queue.put_nowait(frame, priority, bare)
+            self.stats["dropped"] += 1
+        elif self.overflow == COALESCE:
+            self.stats["dropped"] += sub.clear()
+            if self.snapshot is not None:
+                sub.queue.put_nowait(self._snapshot_frame(sub.class_id, sub.encoding))
+            else:
+                sub.queue.put_nowait(sub.encoding.resync)
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["dropped"] += self._close(sub)
+            self.stats["evicted"] += 1
+
+    @staticmethod
+    def _close(sub):
+        # Hang up on a subscriber; returns how many queued events were discarded
+        dropped = sub.clear()
+        sub.evicted = True
+        sub.queue.put_nowait(None) # wakes the stream if it is waiting for events
+        sub.writer.transport.abort() # or fails its pending drain() if the socket is stuck
+        return dropped
+
+    # --- keepalive / reaping ---
+
+    async def _sweep(self):
+        # Idle streams never get a write, so a dead peer would otherwise never be noticed.
+        # Each pass pings idle subscribers, reaps stalled ones and drops state for
+        # classrooms that no longer exist.
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = self.loop.time()
+
+            for class_id in list(self.subscribers):
+                orphaned = not self.classroom_exists(class_id)
+                for sub in list(self.subscribers[class_id]):
+                    if orphaned or sub.stalled(now, self.idle_timeout):
+                        self._reap(sub)
+                    elif sub.queue.empty():
+                        sub.queue.put_nowait(sub.encoding.keepalive)
+
+            for class_id in list(self.history):
+                if class_id not in self.subscribers and not self.classroom_exists(class_id):
+                    del self.history[class_id]
+                    del self.last_seq[class_id]
+
+    def _reap(self, sub):
+        subs = self.subscribers.get(sub.class_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self.subscribers[sub.class_id]
+        self._close(sub)
+        self.stats["reaped"] += 1
+
+    def forget(self, class_id):
+        # Drop replay state for a classroom that was archived (safe from any thread);
+        # a later stream for it starts from a snapshot
+        if self.loop is None:
+            return
+
+        def drop():
+            if class_id not in self.subscribers:
+                self.history.pop(class_id, None)
+                self.last_seq.pop(class_id, None)
+        self.loop.call_soon_threadsafe(drop)
+
+    def subscriber_count(self, class_id):
+        return len(self.subscribers.get(class_id, ()))
+
+    def stream_metrics(self, timeout=1.0):
+        # {class_id: (subscribers, deepest queue)}, read on the loop thread; safe from any thread.
+        # None if the loop is too busy to answer within timeout.
+        if self.loop is None:
+            return {}
+
+        async def collect():
+            return {
+                class_id: (len(subs), max(sub.queue.qsize() for sub in subs))
+                for class_id, subs in self.subscribers.items()
+            }
+        future = asyncio.run_coroutine_threadsafe(collect(), self.loop)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            return None
+
+    def _snapshot_frame(self, class_id, encoding):
+        # Built on the loop thread, so it covers every event already fanned out;
+        # tagged with the last of them so a resume replays only what follows.
+        # Events still on their way may be in it too: clients skip deltas whose
+        # version the snapshot already has.
+        return encoding.frame(self.last_seq.get(class_id, 0), self.snapshot(class_id))
+
+    def _catch_up(self, class_id, last_event_id, encoding):
+        # What a new subscriber is sent before live events: the frames it missed
+        # when resuming from last_event_id, if they are still in the ring buffer,
+        # otherwise a snapshot (or "resync" when there is no snapshot source)
+        missed = self._replay(class_id, last_event_id)
+        if missed is not None:
+            return [encoding.frame(seq, payload) for seq, payload in missed]
+        if self.snapshot is not None:
+            return [self._snapshot_frame(class_id, encoding)]
+        return [encoding.resync] if last_event_id is not None else []
+
+    def _replay(self, class_id, last_event_id):
+        # (seq, payload) after last_event_id, or None if the client can't be caught up
+        # from history (new client, fell out of the ring buffer, server restarted)
+        if last_event_id is None:
+            return None
+        try:
+            last = int(last_event_id)
+        except ValueError:
+            return None
+
+        current = self.last_seq.get(class_id, 0)
+        if last == current:
+            return []
+
+        history = self.history.get(class_id, ())
+        if last > current or not history or last < history[0][0] - 1:
+            return None
+
+        return [(seq, payload) for seq, payload in history if seq > last]
+
+    # --- connections ---
+
+    async def _handle_client(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            # Let the kernel fail writes to a peer that stopped acking (asleep laptop, dead Wi-Fi)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, "TCP_USER_TIMEOUT"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, self.idle_timeout * 1000)
+        try:
+            request_line, headers = await self._read_head(reader)
+            if headers is None:
+                await self._send_status(writer, "431 Request Header Fields Too Large", b"Request headers too large")
+                return
+
+            parts = request_line.decode("latin-1").split()
+            class_id, endpoint, query = self._parse_path(parts[1]) if len(parts) == 3 else (None, None, None)
+            if class_id is None or parts[0] != "GET" or (endpoint == "ws" and self.handle_message is None):
+                await self._send_status(writer, "404 Not Found", b"Not found")
+                return
+            if not self.classroom_exists(class_id):
+                await self._send_status(writer, "404 Not Found", b"Classroom not found")
+                return
+
+            if endpoint == "ws":
+                if headers.get("upgrade", "").lower() != "websocket" or "sec-websocket-key" not in headers:
+                    await self._send_status(writer, "426 Upgrade Required", b"WebSocket upgrade required")
+                    return
+                last_event_id = query.get("last_event_id", [headers.get("last-event-id")])[0]
+                subscribe = query.get("events", ["1"])[0] != "0"
+                await self._socket(class_id, reader, writer, headers["sec-websocket-key"], last_event_id, subscribe)
+                return
+
+            encoding = negotiate(headers.get("accept"))
+            if encoding is None:
+                await self._send_status(writer, "406 Not Acceptable", b"msgpack is not available on this server")
+                return
+
+            await self._stream(class_id, reader, writer, headers.get("last-event-id"), ENCODINGS[encoding])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_head(reader):
+        # (request line, {header: value}), or headers None past MAX_REQUEST_HEAD / MAX_HEADERS
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            size = len(request_line)
+            for count in itertools.count(1):
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    return request_line, headers
+                size += len(line)
+                if size > MAX_REQUEST_HEAD or count > MAX_HEADERS:
+                    return request_line, None
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except ValueError: # one line over the reader's own limit
+            return b"", None
+
+    @staticmethod
+    def _parse_path(target):
+        # /classrooms/<class_id>/stream or /ws -> (class_id, "stream" | "ws", query), else Nones
+        url = urlsplit(target)
+        parts = url.path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "classrooms" and parts[2] in ("stream", "ws"):
+            # The API's redirect quotes ids with spaces and the like
+            return unquote(parts[1]), parts[2], parse_qs(url.query)
+        return None, None, None
+
+    @staticmethod
+    async def _send_status(writer, status, body):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _stream(self, class_id, reader, writer, last_event_id=None, encoding=ENCODINGS["json"]):
+        head = (
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: " + encoding.content_type + b"\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+            + encoding.hello
+        )
+        # Teachers never send anything after the request, so EOF on the read side means they left
+        await self._serve(class_id, writer, encoding, head, last_event_id, lambda sub: self._discard(reader))
+
+    async def _socket(self, class_id, reader, writer, key, last_event_id, subscribe):
+        head = handshake_response(key)
+        await self._serve(
+            class_id, writer, WebSocketEncoding, head, last_event_id, lambda sub: self._listen(sub, reader), subscribe
+        )
+
+    async def _serve(self, class_id, writer, encoding, head, last_event_id, listen, subscribe=True):
+        # Write `head`, then the subscriber's queued frames until listen(sub) returns
+        # (the client hung up) or the subscriber is evicted.
+        # Subscribing and writing the snapshot / replay happen with no await in between,
+        # so no event can fall between the two or be sent twice
+        sub = Subscriber(class_id, self.queue_size, writer, encoding)
+        if subscribe: # request-only sockets (students) aren't teacher streams: not counted
+            self.subscribers.setdefault(class_id, set()).add(sub)
+            self.stats["connects"] += 1
+
+        hangup = asyncio.ensure_future(listen(sub))
+        try:
+            writer.write(head)
+            if subscribe:
+                writer.writelines(self._catch_up(class_id, last_event_id, encoding))
+            await writer.drain()
+
+            while True:
+                getter = asyncio.ensure_future(sub.queue.get())
+                done, _ = await asyncio.wait({getter, hangup}, return_when=asyncio.FIRST_COMPLETED)
+                if hangup in done:
+                    getter.cancel()
+                    break
+                frame = getter.result()
+                if frame is None: # evicted as a slow consumer
+                    break
+                writer.write(frame)
+                await writer.drain()
+                sub.last_write = self.loop.time()
+        finally:
+            hangup.cancel()
+            subs = self.subscribers.get(class_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self.subscribers[class_id]
+            if subscribe:
+                self.stats["disconnects"] += 1
+                print(f"Teacher disconnected from {class_id}")
+
+    @staticmethod
+    async def _discard(reader):
+        # Until EOF, dropping whatever arrives chunk by chunk so it is never buffered up
+        while await reader.read(4096):
+            pass
+
+    async def _listen(self, sub, reader):
+        # Read a socket's requests until it closes. Replies (and pongs) are
+        # written straight to the socket rather than queued behind pushed
+        # events; waiting for each to drain stops a client that never reads
+        # from piling up replies.
+        writer = sub.writer
+
+        def control(opcode, payload):
+            if opcode == OP_PING:
+                writer.write(encode_frame(OP_PONG, payload))
+            elif opcode != OP_PONG: # close: answer it, then we're done
+                writer.write(close_frame(CLOSE_NORMAL))
+
+        try:
+            while True:
+                text = await read_message(reader, control)
+                if text is None:
+                    return
+                writer.write(await self._dispatch(sub.class_id, text))
+                await writer.drain()
+        except ProtocolError as e:
+            writer.write(close_frame(e.code, str(e)))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    async def _dispatch(self, class_id, text):
+        # One request message -> its reply frame
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            status, body, ref = 400, "Messages must be JSON objects", None
+        else:
+            ref = message.get("ref")
+            try:
+                status, body = await self.loop.run_in_executor(self.executor, self.handle_message, class_id, message)
+            except Exception as e:
+                print(f"{class_id}: socket request failed - {e!r}")
+                status, body = 500, "Internal error"
+        reply = json.dumps({"ref": ref, "status": status, "body": body}, separators=(",", ":"))
+        return encode_frame(OP_TEXT, reply.encode())
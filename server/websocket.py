@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import struct
+
+# Just enough RFC 6455 for the hub's classroom sockets: the opening handshake
+# and reading/writing frames on asyncio streams. Frames from clients are
+# always masked; ours never are. Messages are small JSON texts, so anything
+# over MAX_MESSAGE is refused instead of buffered.
+
+OP_CONTINUATION, OP_TEXT, OP_BINARY = 0x0, 0x1, 0x2
+OP_CLOSE, OP_PING, OP_PONG = 0x8, 0x9, 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_UNSUPPORTED = 1003 # binary messages
+CLOSE_INVALID_DATA = 1007 # text that isn't UTF-8
+CLOSE_TOO_BIG = 1009
+
+MAX_MESSAGE = 64 * 1024
+
+_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class ProtocolError(Exception):
+    def __init__(self, code, reason):
+        super().__init__(reason)
+        self.code = code
+
+
+def accept_key(key):
+    # Sec-WebSocket-Accept for a client's Sec-WebSocket-Key
+    return base64.b64encode(hashlib.sha1(key.encode() + _GUID).digest()).decode()
+
+
+def handshake_response(key):
+    return (
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n"
+    ).encode()
+
+
+def encode_frame(opcode, payload=b""):
+    # One unfragmented, unmasked frame (server -> client)
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def close_frame(code, reason=""):
+    return encode_frame(OP_CLOSE, struct.pack("!H", code) + reason.encode()[:123])
+
+
+async def read_frame(reader, limit=MAX_MESSAGE):
+    # (fin, opcode, unmasked payload) of the next frame from a client
+    first, second = await reader.readexactly(2)
+    fin, opcode = first & 0x80, first & 0x0F
+    if not second & 0x80:
+        raise ProtocolError(CLOSE_PROTOCOL_ERROR, "Client frames must be masked")
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > limit:
+        raise ProtocolError(CLOSE_TOO_BIG, "Message too big")
+    mask = await reader.readexactly(4)
+    data = await reader.readexactly(length)
+    # XOR with the repeating 4-byte mask, done as one big integer instead of byte by byte
+    key = int.from_bytes((mask * (length // 4 + 1))[:length], "big")
+    return bool(fin), opcode, (int.from_bytes(data, "big") ^ key).to_bytes(length, "big")
+
+
+async def read_message(reader, on_control):
+    # The next text message, reassembled from fragments. Control frames in
+    # between go to on_control(opcode, payload); None once the client closes.
+    parts = []
+    size = 0
+    while True:
+        fin, opcode, payload = await read_frame(reader)
+        if opcode >= OP_CLOSE:
+            on_control(opcode, payload)
+            if opcode == OP_CLOSE:
+                return None
+            continue
+        if opcode == OP_BINARY:
+            raise ProtocolError(CLOSE_UNSUPPORTED, "Only text messages are supported")
+        if (opcode == OP_CONTINUATION) != bool(parts):
+            raise ProtocolError(CLOSE_PROTOCOL_ERROR, "Unexpected continuation frame")
+        size += len(payload)
+        if size > MAX_MESSAGE:
+            raise ProtocolError(CLOSE_TOO_BIG, "Message too big")
+        parts.append(payload)
+        if fin:
+            try:
+                return b"".join(parts).decode()
+            except UnicodeDecodeError:
+                raise ProtocolError(CLOSE_INVALID_DATA, "Text messages must be UTF-8")